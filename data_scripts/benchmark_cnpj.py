@@ -0,0 +1,83 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import validacao
+
+# Benchmark da validação de CNPJ: caminho por linha (Series.apply) x caminho vetorizado.
+# Uso: python benchmark_cnpj.py --linhas 1000000 10000000
+
+
+# Gera uma coluna de CNPJs parecida com a do relatório: válidos, inválidos, formatados,
+# sentinela "NAO ENCONTRADO", vazios e com todos os dígitos iguais
+def gerar_cnpjs(qtd, seed=42):
+    rng = np.random.default_rng(seed)
+
+    base = rng.integers(0, 10, size=(qtd, 12))
+    resto1 = (base @ validacao.PESOS_CNPJ_1) % 11
+    d1 = np.where(resto1 < 2, 0, 11 - resto1)
+    com_d1 = np.column_stack([base, d1])
+    resto2 = (com_d1 @ validacao.PESOS_CNPJ_2) % 11
+    d2 = np.where(resto2 < 2, 0, 11 - resto2)
+    matriz = np.column_stack([com_d1, d2])
+
+    # ~20% com dígito verificador errado
+    errados = rng.random(qtd) < 0.2
+    matriz[errados, 13] = (matriz[errados, 13] + 1) % 10
+
+    texto = (matriz + ord('0')).astype(np.uint8).tobytes().decode('ascii')
+    cnpjs = pd.Series([texto[i:i + 14] for i in range(0, qtd * 14, 14)], dtype=object)
+
+    sorteio = rng.random(qtd)
+    formatados = sorteio < 0.05
+    cnpjs[formatados] = cnpjs[formatados].str.replace(
+        r'(\d{2})(\d{3})(\d{3})(\d{4})(\d{2})', r'\1.\2.\3/\4-\5', regex=True)
+    cnpjs[(sorteio >= 0.05) & (sorteio < 0.08)] = "NAO ENCONTRADO"
+    cnpjs[(sorteio >= 0.08) & (sorteio < 0.09)] = "11111111111111"
+    cnpjs[(sorteio >= 0.09) & (sorteio < 0.10)] = cnpjs[(sorteio >= 0.09) & (sorteio < 0.10)].str[2:]
+    cnpjs[(sorteio >= 0.10) & (sorteio < 0.11)] = np.nan
+    return cnpjs
+
+
+# Mesma expressão usada em aplicar_validacoes antes da versão vetorizada
+def flag_por_linha(cnpjs):
+    return cnpjs.apply(lambda x: True if "NAO" in str(x) else (not validacao.validar_digitos_cnpj(x)))
+
+
+def flag_vetorizada(cnpjs):
+    return pd.Series(
+        cnpjs.map(str).str.contains("NAO", regex=False).to_numpy()
+        | ~validacao.validar_digitos_cnpj_vetorizado(cnpjs).to_numpy(),
+        index=cnpjs.index,
+    )
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da validação de CNPJ")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    print(f"{'linhas':>12} | {'por linha (s)':>14} | {'vetorizado (s)':>14} | {'speedup':>8}")
+    for qtd in args.linhas:
+        cnpjs = gerar_cnpjs(qtd)
+
+        esperado, tempo_linha = cronometrar(flag_por_linha, cnpjs)
+        obtido, tempo_vetor = cronometrar(flag_vetorizada, cnpjs)
+
+        if not esperado.astype(bool).equals(obtido):
+            divergentes = cnpjs[esperado.astype(bool) != obtido]
+            raise SystemExit(f"Resultados divergentes em {len(divergentes)} linhas, ex: {divergentes.head().tolist()}")
+
+        print(f"{qtd:>12,} | {tempo_linha:>14.2f} | {tempo_vetor:>14.2f} | {tempo_linha / tempo_vetor:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
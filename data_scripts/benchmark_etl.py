@@ -0,0 +1,192 @@
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import gerador_dados
+
+# Benchmark das etapas do ETL (processador.processar_tudo e validacao.executar_pipeline) com dados sintéticos.
+# Para cada etapa mede tempo total, linhas/s e pico de memória (RSS), salva o resultado em um arquivo
+# JSON Lines e compara com a última execução de mesma escala e configuração para apontar regressões.
+# Uso: python benchmark_etl.py --escala 1 10 --pasta /tmp/bench_ans
+
+ARQUIVO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_resultados.jsonl")
+
+# Variáveis de ambiente do ETL que entram na configuração registrada de cada execução
+VARIAVEIS_CONFIGURACAO = ["ETL_WORKERS", "TAMANHO_CHUNK_LEITURA", "FORMATO_SAIDA", "FILTRO_POR_CONTA",
+                          "JOIN_STREAMING", "TAMANHO_CHUNK_JOIN"]
+
+
+# Executada em um processo novo para que cada etapa leia o ambiente ao importar o módulo e
+# tenha o seu próprio pico de memória
+def _executar_etapa(etapa, ambiente, fila):
+    os.environ.update(ambiente)
+    sys.stdout = open(os.devnull, 'w')
+
+    if etapa == "processador":
+        import processador
+        funcao = processador.processar_tudo
+    else:
+        import validacao
+        funcao = validacao.executar_pipeline
+
+    inicio = time.perf_counter()
+    funcao()
+    segundos = time.perf_counter() - inicio
+
+    # ru_maxrss é em KB no Linux; os processos do pool (ETL_WORKERS) entram em RUSAGE_CHILDREN
+    pico_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    fila.put({"segundos": segundos, "pico_rss_mb": round(pico_kb / 1024, 1)})
+
+
+def medir_etapa(etapa, ambiente):
+    contexto = multiprocessing.get_context("spawn")
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_executar_etapa, args=(etapa, ambiente, fila))
+    processo.start()
+    processo.join()
+    if processo.exitcode != 0:
+        raise RuntimeError(f"Etapa '{etapa}' terminou com código {processo.exitcode}")
+    return fila.get()
+
+
+def contar_linhas_consolidadas(base_dir):
+    caminho = os.path.join(base_dir, "manifesto_processamento.json")
+    with open(caminho, 'r', encoding='utf-8') as f:
+        manifesto = json.load(f)
+    return sum(v["linhas"] for v in manifesto["fontes"].values())
+
+
+# Deixa na pasta csv apenas o cadastro, para que a validação não pegue um csv gerado por outra execução
+def limpar_saidas(base_dir):
+    pasta_csv = os.path.join(os.path.dirname(os.path.normpath(base_dir)), "csv")
+    for caminho in glob.glob(os.path.join(pasta_csv, "*.csv")):
+        if not os.path.basename(caminho).startswith("Relatorio_cadop"):
+            os.remove(caminho)
+    for nome in ["consolidado_particoes", "validado_particoes"]:
+        shutil.rmtree(os.path.join(base_dir, nome), ignore_errors=True)
+    for nome in ["manifesto_processamento.json", "manifesto_validacao.json", "contas_eventos.json"]:
+        if os.path.exists(os.path.join(base_dir, nome)):
+            os.remove(os.path.join(base_dir, nome))
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def carregar_resultados(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+# Compara com a execução anterior de mesma escala e configuração
+def verificar_regressoes(resultado, anteriores, tolerancia):
+    anterior = next((r for r in reversed(anteriores)
+                     if r["escala"] == resultado["escala"] and r["configuracao"] == resultado["configuracao"]), None)
+    if anterior is None:
+        return []
+
+    regressoes = []
+    for etapa, medida in resultado["etapas"].items():
+        base = anterior["etapas"].get(etapa)
+        if not base:
+            continue
+        for metrica in ["segundos", "pico_rss_mb"]:
+            if medida[metrica] > base[metrica] * (1 + tolerancia):
+                regressoes.append(f"{etapa}.{metrica}: {base[metrica]} -> {medida[metrica]} (commit anterior {anterior.get('commit')})")
+    return regressoes
+
+
+def executar(escala, pasta, trimestres, linhas_trimestre, regerar):
+    base_dir = os.path.join(pasta, f"escala_{escala:g}", "data")
+    metadados_path = os.path.join(base_dir, "metadados_benchmark.json")
+
+    if regerar or not os.path.exists(metadados_path):
+        print(f"Gerando dados sintéticos (escala {escala:g}x)...")
+        shutil.rmtree(os.path.dirname(base_dir), ignore_errors=True)
+        gerador_dados.gerar(base_dir, escala, trimestres, linhas_trimestre)
+
+    with open(metadados_path, 'r', encoding='utf-8') as f:
+        metadados = json.load(f)
+
+    limpar_saidas(base_dir)
+    # URL inválida: a validação usa o cadastro sintético em vez de baixar o real
+    ambiente = {"BASE_DATA_DIR": base_dir, "ANS_BASE_URL": "http://127.0.0.1:9/"}
+    configuracao = {v: os.environ[v] for v in VARIAVEIS_CONFIGURACAO if v in os.environ}
+
+    etapas = {}
+    medida = medir_etapa("processador", ambiente)
+    medida["linhas"] = metadados["linhas"]
+    etapas["processador"] = medida
+
+    linhas_consolidadas = contar_linhas_consolidadas(base_dir)
+    medida = medir_etapa("validacao", ambiente)
+    medida["linhas"] = linhas_consolidadas
+    etapas["validacao"] = medida
+
+    for medida in etapas.values():
+        medida["segundos"] = round(medida["segundos"], 3)
+        medida["linhas_por_segundo"] = round(medida["linhas"] / medida["segundos"]) if medida["segundos"] else None
+
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "escala": escala,
+        "linhas_trimestre": linhas_trimestre,
+        "trimestres": trimestres,
+        "configuracao": configuracao,
+        "etapas": etapas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do ETL com dados sintéticos")
+    parser.add_argument("--escala", type=float, nargs="+", default=[1.0], help="Ex: 1 10 100")
+    parser.add_argument("--pasta", default="/tmp/benchmark_ans", help="Onde os dados sintéticos são gerados")
+    parser.add_argument("--trimestres", type=int, default=4)
+    parser.add_argument("--linhas-trimestre", type=int, default=gerador_dados.LINHAS_TRIMESTRE_REAL)
+    parser.add_argument("--regerar", action="store_true", help="Gera os dados novamente mesmo se já existirem")
+    parser.add_argument("--resultados", default=ARQUIVO_RESULTADOS)
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="Piora relativa aceita antes de apontar regressão")
+    parser.add_argument("--falhar-em-regressao", action="store_true")
+    args = parser.parse_args()
+
+    anteriores = carregar_resultados(args.resultados)
+    houve_regressao = False
+
+    print(f"{'escala':>7} | {'etapa':<12} | {'linhas':>12} | {'tempo (s)':>10} | {'linhas/s':>12} | {'pico RSS (MB)':>13}")
+    for escala in args.escala:
+        resultado = executar(escala, args.pasta, args.trimestres, args.linhas_trimestre, args.regerar)
+
+        for etapa, m in resultado["etapas"].items():
+            print(f"{escala:>6g}x | {etapa:<12} | {m['linhas']:>12,} | {m['segundos']:>10.2f} | "
+                  f"{m['linhas_por_segundo']:>12,} | {m['pico_rss_mb']:>13.1f}")
+
+        for regressao in verificar_regressoes(resultado, anteriores, args.tolerancia):
+            houve_regressao = True
+            print(f"   [REGRESSÃO] {regressao}")
+
+        with open(args.resultados, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        anteriores.append(resultado)
+
+    if houve_regressao and args.falhar_em_regressao:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Gerador de dados falsos no formato dos arquivos da ANS, para medir o ETL sem acessar dadosabertos.ans.gov.br.
+# Gera a árvore downloads_ans/csv/<ano>/<trimestre>/ com os ZIPs das demonstrações contábeis e um
+# Relatorio_cadop.csv correspondente na pasta csv (um nível acima de data), como o pipeline espera.
+# Uso: python gerador_dados.py --destino /tmp/bench/data --escala 10
+
+# Aproximadamente a quantidade de linhas de um trimestre real de demonstrações contábeis
+LINHAS_TRIMESTRE_REAL = 700_000
+QTD_OPERADORAS = 1_100
+LINHAS_POR_BLOCO = 200_000
+
+# Contas contábeis com as descrições como aparecem nos arquivos da ANS (a maioria não é de eventos)
+CONTAS = [
+    (41, "EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS"),
+    (411, "Eventos / Sinistros Conhecidos ou Avisados de Assistência a Saúde Médico Hospitalar"),
+    (4111, "Despesas com Eventos / Sinistros - Judicial"),
+    (412, "Eventos / Sinistros Conhecidos ou Avisados de Assistência Odontológica"),
+    (31, "CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE"),
+    (311, "Receitas com Operações de Assistência à Saúde"),
+    (32, "OUTRAS RECEITAS OPERACIONAIS"),
+    (43, "DESPESAS DE COMERCIALIZAÇÃO"),
+    (46, "DESPESAS ADMINISTRATIVAS"),
+    (47, "DESPESAS FINANCEIRAS"),
+    (12, "ATIVO CIRCULANTE"),
+    (21, "PASSIVO CIRCULANTE"),
+]
+
+MODALIDADES = ["Medicina de Grupo", "Cooperativa Médica", "Autogestão", "Seguradora Especializada em Saúde",
+               "Odontologia de Grupo", "Filantropia", "Cooperativa Odontológica"]
+UFS = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "PE", "CE", "GO", "DF", "ES", "PA", "AM", "MT", "MS"]
+
+PESOS_CNPJ_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_CNPJ_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def gerar_cnpjs_validos(rng, qtd):
+    base = rng.integers(0, 10, size=(qtd, 12))
+    resto1 = (base @ PESOS_CNPJ_1) % 11
+    com_d1 = np.column_stack([base, np.where(resto1 < 2, 0, 11 - resto1)])
+    resto2 = (com_d1 @ PESOS_CNPJ_2) % 11
+    matriz = np.column_stack([com_d1, np.where(resto2 < 2, 0, 11 - resto2)])
+    return ["".join(map(str, linha)) for linha in matriz]
+
+
+# Cadastro com operadoras duplicadas, CNPJs inválidos e campos vazios, como o real
+def gerar_cadastro(rng, registros, caminho):
+    qtd = len(registros)
+    cnpjs = gerar_cnpjs_validos(rng, qtd)
+    for i in rng.choice(qtd, size=max(1, qtd // 50), replace=False):
+        cnpjs[i] = cnpjs[i][:13] + str((int(cnpjs[i][13]) + 1) % 10)
+
+    df = pd.DataFrame({
+        "REGISTRO_OPERADORA": registros,
+        "CNPJ": cnpjs,
+        "Razao_Social": [f"OPERADORA DE SAÚDE {r} LTDA" for r in registros],
+        "Nome_Fantasia": [f"SAÚDE {r}" for r in registros],
+        "Modalidade": rng.choice(MODALIDADES, size=qtd),
+        "Logradouro": "RUA DAS FLORES", "Numero": "100", "Complemento": "", "Bairro": "CENTRO",
+        "Cidade": "SÃO PAULO", "UF": rng.choice(UFS, size=qtd), "CEP": "01001000", "DDD": "11",
+        "Telefone": "30000000", "Fax": "", "Endereco_eletronico": "contato@operadora.com.br",
+        "Representante": "FULANO DE TAL", "Cargo_Representante": "DIRETOR",
+        "Regiao_de_Comercializacao": rng.integers(1, 7, size=qtd),
+        "Data_Registro_ANS": "2000-01-01",
+    })
+    # Alguns registros duplicados, que o pipeline deve descartar
+    df = pd.concat([df, df.sample(n=max(1, qtd // 100), random_state=1)], ignore_index=True)
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    df.to_csv(caminho, sep=';', index=False, encoding='latin1', quoting=csv.QUOTE_MINIMAL)
+
+
+def gerar_bloco(rng, qtd, registros, ano, trimestre, datas_invalidas):
+    contas = rng.integers(0, len(CONTAS), size=qtd)
+    mes = (trimestre - 1) * 3 + 1
+    valores = rng.normal(50_000, 80_000, size=qtd).round(2)
+    df = pd.DataFrame({
+        "DATA": f"{ano}-{mes:02d}-01" if not datas_invalidas else "31/02/XXXX",
+        "REG_ANS": rng.choice(registros, size=qtd),
+        "CD_CONTA_CONTABIL": [CONTAS[c][0] for c in contas],
+        "DESCRICAO": [CONTAS[c][1] for c in contas],
+        "VL_SALDO_INICIAL": np.abs(valores).round(2),
+        "VL_SALDO_FINAL": valores,
+    })
+    # Valores no padrão brasileiro (vírgula decimal)
+    for col in ["VL_SALDO_INICIAL", "VL_SALDO_FINAL"]:
+        df[col] = df[col].map(lambda v: f"{v:.2f}".replace(".", ","))
+    return df
+
+
+# Um trimestre por arquivo, alternando separador; um dos trimestres vem com datas inválidas e outro em XLSX
+def gerar_trimestre(rng, pasta, ano, trimestre, linhas, registros, variante):
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{trimestre}T{ano}"
+    datas_invalidas = variante == "datas_invalidas"
+
+    with zipfile.ZipFile(os.path.join(pasta, f"{nome}.zip"), 'w', zipfile.ZIP_DEFLATED) as zf:
+        if variante == "xlsx":
+            # Excel é limitado a ~1M de linhas e é lento para gerar; a variante fica com um tamanho reduzido
+            df = gerar_bloco(rng, min(linhas, 100_000), registros, ano, trimestre, datas_invalidas)
+            buffer = io.BytesIO()
+            df.to_excel(buffer, index=False)
+            zf.writestr(f"{nome}.xlsx", buffer.getvalue())
+            return len(df)
+
+        sep = ";" if variante != "virgula" else ","
+        with zf.open(f"{nome}.csv", 'w') as destino:
+            texto = io.TextIOWrapper(destino, encoding='latin1', newline='')
+            restantes = linhas
+            primeiro = True
+            while restantes > 0:
+                qtd = min(LINHAS_POR_BLOCO, restantes)
+                gerar_bloco(rng, qtd, registros, ano, trimestre, datas_invalidas).to_csv(
+                    texto, sep=sep, index=False, header=primeiro, quoting=csv.QUOTE_MINIMAL)
+                primeiro = False
+                restantes -= qtd
+            texto.detach()
+    return linhas
+
+
+def gerar(destino, escala=1.0, trimestres=4, linhas_trimestre=LINHAS_TRIMESTRE_REAL, seed=42):
+    rng = np.random.default_rng(seed)
+    total = int(escala * linhas_trimestre)
+    por_arquivo = max(1, total // trimestres)
+
+    registros = np.sort(rng.choice(np.arange(300_000, 430_000), size=QTD_OPERADORAS, replace=False))
+    # 5% das despesas são de operadoras que não estão no cadastro
+    registros_despesas = np.concatenate([registros, rng.integers(900_000, 999_999, size=QTD_OPERADORAS // 20)])
+
+    variantes = ["padrao", "virgula", "datas_invalidas", "xlsx"]
+    base_csv = os.path.join(destino, "downloads_ans", "csv")
+    linhas_geradas = 0
+    periodos = [(2025 - i // 4, 4 - i % 4) for i in range(trimestres)]
+
+    for i, (ano, trimestre) in enumerate(periodos):
+        variante = variantes[i % len(variantes)]
+        pasta = os.path.join(base_csv, str(ano), f"{trimestre}T")
+        qtd = gerar_trimestre(rng, pasta, ano, trimestre, por_arquivo, registros_despesas, variante)
+        linhas_geradas += qtd
+        print(f"   {ano}/{trimestre}T ({variante}): {qtd} linhas")
+
+    pasta_csv = os.path.join(os.path.dirname(os.path.normpath(destino)), "csv")
+    gerar_cadastro(rng, registros, os.path.join(pasta_csv, "Relatorio_cadop.csv"))
+
+    metadados = {"escala": escala, "trimestres": trimestres, "linhas": linhas_geradas, "operadoras": len(registros), "seed": seed}
+    with open(os.path.join(destino, "metadados_benchmark.json"), 'w', encoding='utf-8') as f:
+        json.dump(metadados, f, indent=2)
+    return metadados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados falsos no formato da ANS")
+    parser.add_argument("--destino", required=True, help="Pasta 'data' de destino (BASE_DATA_DIR)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Múltiplo do tamanho de um trimestre real")
+    parser.add_argument("--trimestres", type=int, default=4)
+    parser.add_argument("--linhas-trimestre", type=int, default=LINHAS_TRIMESTRE_REAL)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    metadados = gerar(args.destino, args.escala, args.trimestres, args.linhas_trimestre, args.seed)
+    print(f"Gerado: {metadados['linhas']} linhas em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import carregador
 import processador
 import scrapper
 import validacao
@@ -5,4 +6,8 @@ import validacao
 if __name__ == "__main__":
     scrapper.scrapping()
     processador.processar_tudo()
-    validacao.executar_pipeline()
\ No newline at end of file
+    validacao.executar_pipeline()
+
+    # Carga direta no Postgres (opcional, CARGA_BANCO=true)
+    if carregador.CARGA_BANCO:
+        carregador.carregar_banco()
@@ -4,18 +4,47 @@ import csv
 import zipfile
 import warnings
 import re
+import io
+import json
+import shutil
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
 
 warnings.filterwarnings("ignore")
 
 # Caminhos utilizados
 BASE_DIR = os.getenv("BASE_DATA_DIR", "data")
 DIRETORIO_ENTRADA = os.path.join(BASE_DIR, "downloads_ans")
-ARQUIVO_INTERMEDIARIO = os.path.join(BASE_DIR, "data_teste_consolidado_temp.csv")
 ARQUIVO_FINAL_ZIP = os.path.join(BASE_DIR, "consolidado_despesas.zip")
+# Despesas consolidadas divididas por Ano/Trimestre, com um arquivo por arquivo de origem em cada partição
+DIRETORIO_PARTICOES = os.path.join(BASE_DIR, "consolidado_particoes")
+# Hash e quantidade de linhas de cada arquivo de origem já processado
+ARQUIVO_MANIFESTO = os.path.join(BASE_DIR, "manifesto_processamento.json")
+
+# No modo incremental somente os arquivos novos ou alterados desde a última execução são processados
+PROCESSAMENTO_INCREMENTAL = os.getenv("PROCESSAMENTO_INCREMENTAL", "false").lower() in ("1", "true", "sim")
+
+# Formato das partições: 'csv' ou 'parquet' (colunar e tipado, requer pyarrow)
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "csv").lower()
+
+# Quantidade de processos usados na normalização dos arquivos (1 = serial)
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", "1"))
+
+# Quantidade de linhas lidas por vez de cada arquivo
+TAMANHO_CHUNK_LEITURA = int(os.getenv("TAMANHO_CHUNK_LEITURA", "100000"))
 
 # Regex para pegar somente as despesas com assunto "Despesas com Eventos / Sinistros ..."
 REGEX_PALAVRAS_CHAVE = r"despesas? com eventos?|despesas? com sinistros?|eventos? \/ sinistros?"
 
+# Filtro pelo código da conta contábil (CD_CONTA_CONTABIL): o regex é aplicado uma única vez nas descrições
+# distintas de cada conta e o resultado fica salvo em ARQUIVO_CONTAS_EVENTOS. Arquivos sem a coluna usam o regex
+FILTRO_POR_CONTA = os.getenv("FILTRO_POR_CONTA", "false").lower() in ("1", "true", "sim")
+ARQUIVO_CONTAS_EVENTOS = os.path.join(BASE_DIR, "contas_eventos.json")
+_CONTAS_EVENTOS = None
+
 # Possíveis nomes de coluna que pode haver no documento e nome específico para substituir
 MAPA_COLUNAS = {
     
@@ -37,17 +66,68 @@ MAPA_COLUNAS = {
     'CD_CONTA_CONTABIL': 'CONTA'
 }
 
+# Regex que identifica, pelo nome, os arquivos contábeis dentro dos ZIPs (ex: 1T2025.csv)
+REGEX_MEMBROS_CONTABEIS = r"[1-4]\s*t\s*\d{4}|\d{4}\s*[_-]?\s*[1-4]\s*t"
+
+EXTENSOES_SUPORTADAS = ('csv', 'txt', 'xlsx')
+
+# Abre o arquivo em modo binário. Se 'membro' for informado, 'caminho' é um ZIP e o membro é lido
+# como stream direto do ZIP, sem extração para o disco
+@contextmanager
+def abrir_fonte(caminho, membro=None):
+    if membro is None:
+        with open(caminho, 'rb') as f:
+            yield f
+    else:
+        with zipfile.ZipFile(caminho, 'r') as zf, zf.open(membro) as f:
+            yield f
+
+# Nome usado nas mensagens e para extrair ano/trimestre do caminho
+def nome_fonte(caminho, membro=None):
+    return caminho if membro is None else os.path.join(caminho, membro)
+
 # Detectar separador do documento
-def detectar_separador(caminho_arquivo):
+def detectar_separador(caminho_arquivo, membro=None):
     try:
-        with open(caminho_arquivo, 'r', encoding='latin1', errors='ignore') as f:
-            sample = f.read(2048)
+        with abrir_fonte(caminho_arquivo, membro) as f:
+            sample = f.read(2048).decode('latin1', errors='ignore')
             if ';' in sample: return ';'
             sniffer = csv.Sniffer()
             return sniffer.sniff(sample).delimiter
     except:
         return ';'
 
+# Lista os arquivos a processar: arquivos soltos e membros contábeis de cada ZIP.
+# Membros que já foram extraídos na mesma pasta são ignorados para não duplicar as despesas
+def listar_fontes(diretorio):
+    fontes = []
+    for root, dirs, files in os.walk(diretorio):
+        for file in files:
+            caminho = os.path.join(root, file)
+            nome = file.lower()
+
+            if nome.endswith(EXTENSOES_SUPORTADAS):
+                fontes.append((caminho, None))
+
+            elif nome.endswith('.zip'):
+                try:
+                    with zipfile.ZipFile(caminho, 'r') as zf:
+                        membros = [m.filename for m in zf.infolist() if not m.is_dir()]
+                except zipfile.BadZipFile:
+                    print(f"   [X] Erro: Arquivo corrompido: {file}")
+                    continue
+
+                for membro in membros:
+                    base = os.path.basename(membro)
+                    if not base.lower().endswith(EXTENSOES_SUPORTADAS) or membro.startswith('__MACOSX'):
+                        continue
+                    if not re.search(REGEX_MEMBROS_CONTABEIS, base, flags=re.IGNORECASE):
+                        continue
+                    if os.path.exists(os.path.join(root, base)):
+                        continue
+                    fontes.append((caminho, membro))
+    return fontes
+
 # Função para pegar ano e trimestre do nome dos diretórios caso a despesa esteja com a data inválida
 def extrair_data_do_caminho(caminho_arquivo):
     try:
@@ -65,24 +145,124 @@ def extrair_data_do_caminho(caminho_arquivo):
     except:
         return None, None
 
+# Colunas do arquivo original que precisam ser lidas: as mapeadas em MAPA_COLUNAS e as candidatas
+# a registro da operadora ('COD' ou 'CD_'), usadas como alternativa em normalizar_e_processar
+def coluna_necessaria(nome):
+    nome = str(nome).strip().upper()
+    return nome in MAPA_COLUNAS or 'COD' in nome or 'CD_' in nome
+
+# Mantém apenas as linhas de 'Despesas com Eventos / Sinistros', antes de juntar os pedaços do arquivo
+# Com FILTRO_POR_CONTA, usa o código da conta contábil quando o arquivo possui essa coluna
+def filtrar_eventos(df):
+    col_desc = encontrar_coluna(df, 'DESC')
+    if col_desc is None:
+        return df.iloc[0:0]
+
+    col_conta = encontrar_coluna(df, 'CONTA')
+    if FILTRO_POR_CONTA and col_conta is not None:
+        return filtrar_por_conta(df, col_conta, col_desc)
+
+    filtro = df[col_desc].astype(str).str.contains(REGEX_PALAVRAS_CHAVE, case=False, regex=True, na=False)
+    return df[filtro]
+
+# Encontra a coluna pelo nome original (ex: NM_CONTA) ou pelo nome já normalizado (ex: DESC)
+def encontrar_coluna(df, destino):
+    return next((c for c in df.columns if c == destino or MAPA_COLUNAS.get(str(c).strip().upper()) == destino), None)
+
+# Cache das contas contábeis já classificadas: código -> se é conta de "Eventos / Sinistros".
+# É descartado se o regex mudar
+def carregar_contas_eventos():
+    global _CONTAS_EVENTOS
+    if _CONTAS_EVENTOS is None:
+        _CONTAS_EVENTOS = {}
+        if os.path.exists(ARQUIVO_CONTAS_EVENTOS):
+            try:
+                with open(ARQUIVO_CONTAS_EVENTOS, 'r', encoding='utf-8') as f:
+                    conteudo = json.load(f)
+                if conteudo.get("regex") == REGEX_PALAVRAS_CHAVE:
+                    _CONTAS_EVENTOS = {int(k): v for k, v in conteudo.get("contas", {}).items()}
+            except (ValueError, OSError):
+                pass
+    return _CONTAS_EVENTOS
+
+# Junta com o que já está no disco (outro processo do pool pode ter aprendido outras contas) e grava de forma atômica
+def salvar_contas_eventos(contas):
+    try:
+        with open(ARQUIVO_CONTAS_EVENTOS, 'r', encoding='utf-8') as f:
+            conteudo = json.load(f)
+        if conteudo.get("regex") == REGEX_PALAVRAS_CHAVE:
+            for k, v in conteudo.get("contas", {}).items():
+                contas.setdefault(int(k), v)
+    except (ValueError, OSError):
+        pass
+
+    temporario = f"{ARQUIVO_CONTAS_EVENTOS}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({"regex": REGEX_PALAVRAS_CHAVE, "contas": {str(k): v for k, v in sorted(contas.items())}}, f, indent=2)
+    os.replace(temporario, ARQUIVO_CONTAS_EVENTOS)
+
+# Classifica as contas ainda desconhecidas aplicando o regex uma vez por descrição distinta
+def aprender_contas(codigos, descricoes):
+    contas = carregar_contas_eventos()
+    pares = pd.DataFrame({'conta': codigos, 'desc': descricoes.astype(str)}).drop_duplicates()
+    pares['evento'] = pares['desc'].str.contains(REGEX_PALAVRAS_CHAVE, case=False, regex=True, na=False)
+    for conta, evento in pares.groupby('conta')['evento'].any().items():
+        contas[int(conta)] = bool(evento)
+    salvar_contas_eventos(contas)
+
+# Filtro pelo código da conta: teste de pertinência vetorizado contra as contas de eventos conhecidas.
+# Linhas sem código numérico usam o regex na descrição
+def filtrar_por_conta(df, col_conta, col_desc):
+    codigos = pd.to_numeric(df[col_conta], errors='coerce')
+    com_codigo = (codigos.notna() & (codigos % 1 == 0)).to_numpy()
+
+    contas = carregar_contas_eventos()
+    desconhecidas = com_codigo & ~codigos.isin(list(contas)).to_numpy()
+    if desconhecidas.any():
+        aprender_contas(codigos[desconhecidas], df.loc[desconhecidas, col_desc])
+
+    filtro = codigos.isin([c for c, evento in contas.items() if evento]).to_numpy() & com_codigo
+    if not com_codigo.all():
+        sem_codigo = df.loc[~com_codigo, col_desc].astype(str).str.contains(REGEX_PALAVRAS_CHAVE, case=False, regex=True, na=False)
+        filtro[~com_codigo] = sem_codigo.to_numpy()
+    return df[filtro]
+
+# Lê o csv em pedaços de tamanho fixo, filtrando cada pedaço. O pico de memória depende do tamanho
+# do pedaço e das linhas aproveitadas, não do tamanho do arquivo
+def ler_csv_em_chunks(f, sep):
+    pedacos = [
+        filtrar_eventos(chunk)
+        for chunk in pd.read_csv(f, sep=sep, encoding='latin1', on_bad_lines='skip',
+                                 usecols=coluna_necessaria, chunksize=TAMANHO_CHUNK_LEITURA)
+    ]
+    if not pedacos:
+        return pd.DataFrame()
+    return pd.concat(pedacos, ignore_index=True)
+
 # Função para carregar arquivo pensando nas possíveis diferentes extensões
-def carregar_arquivo(caminho):
-    ext = caminho.lower().split('.')[-1]
+def carregar_arquivo(caminho, membro=None):
+    nome = nome_fonte(caminho, membro)
+    ext = nome.lower().split('.')[-1]
     try:
         if ext in ['csv', 'txt']:
-            sep = detectar_separador(caminho)
-            df = pd.read_csv(caminho, sep=sep, encoding='latin1', on_bad_lines='skip')
+            sep = detectar_separador(caminho, membro)
+            with abrir_fonte(caminho, membro) as f:
+                df = ler_csv_em_chunks(f, sep)
         elif ext in ['xlsx', 'xls']:
-            df = pd.read_excel(caminho)
+            with abrir_fonte(caminho, membro) as f:
+                # O leitor de excel precisa de um arquivo com seek, então o membro do ZIP é lido para a memória
+                df = pd.read_excel(f if membro is None else io.BytesIO(f.read()), usecols=coluna_necessaria)
+            df = filtrar_eventos(df)
         else:
             return None
         return df
     except Exception as e:
-        print(f"   [X] Erro leitura {os.path.basename(caminho)}: {e}")
+        print(f"   [X] Erro leitura {os.path.basename(nome)}: {e}")
         return None
 
-# Função para normalizar a tabela, filtar apenas as despesas que são referentes a
-# 'Despesas com Eventos / Sinistros' e criar a coluna de despesas suspeitas
+# Função para normalizar a tabela e criar a coluna de despesas suspeitas.
+# O filtro das despesas referentes a 'Despesas com Eventos / Sinistros' já foi aplicado na leitura
+# (carregar_arquivo), pedaço por pedaço, e não é repetido aqui
 def normalizar_e_processar(df, caminho_arquivo):
     
     df.columns = [c.strip().upper() for c in df.columns]
@@ -92,10 +272,7 @@ def normalizar_e_processar(df, caminho_arquivo):
     if 'ValorDespesas' not in df.columns:
         return None
 
-    if 'DESC' in df.columns:
-        filtro = df['DESC'].astype(str).str.contains(REGEX_PALAVRAS_CHAVE, case=False, regex=True, na=False)
-        df = df[filtro]
-    else:
+    if 'DESC' not in df.columns:
         return None
 
     if df.empty:
@@ -140,50 +317,262 @@ def normalizar_e_processar(df, caminho_arquivo):
     
     return df[cols_finais]
 
+# Erro ao ler um arquivo (diferente de um arquivo lido sem nenhuma linha aproveitada)
+class ErroLeitura(Exception):
+    pass
+
+# Resultado de processar_fontes_em_ordem para os arquivos que não puderam ser lidos
+FALHA_LEITURA = object()
+
+# Carrega e normaliza um único arquivo. É executada dentro dos processos do pool no modo paralelo
+def processar_fonte(fonte):
+    caminho, membro = fonte
+    df = carregar_arquivo(caminho, membro)
+    if df is None:
+        raise ErroLeitura(nome_fonte(caminho, membro))
+    return normalizar_e_processar(df, nome_fonte(caminho, membro))
+
+def _resultado_da_fonte(obter):
+    try:
+        return obter()
+    except ErroLeitura:
+        return FALHA_LEITURA
+
+# Gera (fonte, resultado) sempre na ordem da lista de fontes.
+# No modo paralelo, no máximo 2 arquivos por worker ficam em andamento, mantendo a memória constante
+def processar_fontes_em_ordem(fontes, workers):
+    if workers <= 1:
+        for fonte in fontes:
+            yield fonte, _resultado_da_fonte(lambda: processar_fonte(fonte))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        iterador = iter(fontes)
+        pendentes = deque(
+            (fonte, executor.submit(processar_fonte, fonte)) for fonte in islice(iterador, workers * 2)
+        )
+        while pendentes:
+            fonte, futuro = pendentes.popleft()
+            resultado = _resultado_da_fonte(futuro.result)
+
+            proxima = next(iterador, None)
+            if proxima is not None:
+                pendentes.append((proxima, executor.submit(processar_fonte, proxima)))
+
+            yield fonte, resultado
+
+# Identificador estável do arquivo de origem, relativo à pasta de downloads
+def id_fonte(caminho, membro=None):
+    rel = os.path.relpath(caminho, DIRETORIO_ENTRADA).replace(os.sep, '/')
+    return rel if membro is None else f"{rel}!{membro}"
+
+# Hash do conteúdo do arquivo. Para membros de ZIP usa o CRC e o tamanho gravados no próprio ZIP,
+# evitando descompactar o arquivo só para saber se ele mudou
+def calcular_hash_fonte(caminho, membro=None):
+    if membro is not None:
+        with zipfile.ZipFile(caminho, 'r') as zf:
+            info = zf.getinfo(membro)
+        return f"crc32:{info.CRC:08x}:{info.file_size}"
+
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return f"sha256:{h.hexdigest()}"
+
+def carregar_manifesto():
+    if os.path.exists(ARQUIVO_MANIFESTO):
+        try:
+            with open(ARQUIVO_MANIFESTO, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            print("   [Aviso] Manifesto de processamento ilegível, todos os arquivos serão processados.")
+    return {"versao": None, "formato": None, "fontes": {}}
+
+# O formato parquet depende do pyarrow; caso ele não esteja instalado, volta para csv
+def resolver_formato():
+    if FORMATO_SAIDA == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            print("   [Aviso] pyarrow não está instalado, as partições serão gravadas em csv.")
+            return 'csv'
+        return 'parquet'
+    return 'csv'
+
+# Escrita atômica, para que uma interrupção não deixe o manifesto corrompido
+def salvar_manifesto(manifesto):
+    temporario = ARQUIVO_MANIFESTO + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    os.replace(temporario, ARQUIVO_MANIFESTO)
+
+# A versão identifica o conjunto de arquivos consolidados; muda sempre que algum arquivo entra, sai ou é alterado
+def calcular_versao(fontes_manifesto):
+    conteudo = json.dumps(sorted((k, v["hash"]) for k, v in fontes_manifesto.items()))
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]
+
+def nome_particao(ano, trimestre):
+    ano = 'NA' if pd.isna(ano) else int(ano)
+    trimestre = 'NA' if pd.isna(trimestre) else trimestre
+    return f"Ano={ano}/Trimestre={trimestre}"
+
+def nome_fragmento(fonte, formato='csv'):
+    return hashlib.sha1(fonte.encode('utf-8')).hexdigest()[:16] + "." + formato
+
+# Nome dos fragmentos de um arquivo de origem, gravado na sua entrada do manifesto.
+# A validação e a carga localizam os fragmentos por aqui (manifestos antigos não têm o nome)
+def fragmento_da_entrada(fonte, entrada, formato='csv'):
+    return entrada.get("fragmento") or nome_fragmento(fonte, formato)
+
+# Tipos das colunas consolidadas gravadas em parquet
+def tipar_consolidado(df):
+    return df.astype({
+        'REG_ANS': 'string',
+        'Trimestre': 'string',
+        'Ano': 'Int64',
+        'ValorDespesas': 'float64',
+        'DespesasSuspeitas': 'bool',
+    })
+
+# Remove das partições as linhas que vieram de um arquivo de origem
+def remover_fragmentos(fonte, entrada, formato='csv'):
+    for particao in entrada.get("particoes", {}):
+        caminho = os.path.join(DIRETORIO_PARTICOES, particao, fragmento_da_entrada(fonte, entrada, formato))
+        if os.path.exists(caminho): os.remove(caminho)
+
+# Divide as linhas de um arquivo por Ano/Trimestre e grava um fragmento em cada partição
+def gravar_fragmentos(fonte, df_final, formato='csv'):
+    if formato == 'parquet':
+        df_final = tipar_consolidado(df_final)
+
+    particoes = {}
+    for (ano, trimestre), grupo in df_final.groupby(['Ano', 'Trimestre'], dropna=False, sort=True):
+        particao = nome_particao(ano, trimestre)
+        pasta = os.path.join(DIRETORIO_PARTICOES, particao)
+        os.makedirs(pasta, exist_ok=True)
+        destino = os.path.join(pasta, nome_fragmento(fonte, formato))
+        if formato == 'parquet':
+            grupo.to_parquet(destino, index=False)
+        else:
+            grupo.to_csv(destino, sep=';', index=False, encoding='utf-8')
+        particoes[particao] = len(grupo)
+    return particoes
+
+# Lista os fragmentos na ordem do consolidado: partição, e dentro dela o arquivo de origem
+def listar_fragmentos(fontes_manifesto, formato='csv'):
+    fragmentos = []
+    for fonte in sorted(fontes_manifesto):
+        for particao in fontes_manifesto[fonte].get("particoes", {}):
+            nome = fragmento_da_entrada(fonte, fontes_manifesto[fonte], formato)
+            fragmentos.append((particao, os.path.join(DIRETORIO_PARTICOES, particao, nome)))
+    fragmentos.sort(key=lambda f: f[0])
+    return [caminho for _, caminho in fragmentos]
+
+# Monta o ZIP final concatenando os fragmentos, partição por partição, sem carregar os dados em memória.
+# Fragmentos em parquet são convertidos para csv um de cada vez
+def gerar_zip_consolidado(fontes_manifesto, formato='csv'):
+    primeiro = True
+    with zipfile.ZipFile(ARQUIVO_FINAL_ZIP, 'w', zipfile.ZIP_DEFLATED) as zf:
+        with zf.open('consolidado_despesas.csv', 'w') as destino:
+            for caminho in listar_fragmentos(fontes_manifesto, formato):
+                if formato == 'parquet':
+                    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+                    pd.read_parquet(caminho).to_csv(texto, header=primeiro, sep=';', index=False)
+                    texto.detach()
+                    primeiro = False
+                    continue
+
+                with open(caminho, 'rb') as origem:
+                    cabecalho = origem.readline()
+                    if primeiro:
+                        destino.write(cabecalho)
+                        primeiro = False
+                    shutil.copyfileobj(origem, destino)
+
 # Função principal
-def processar_tudo():
-    print(f"--- Iniciando Consolidação ---")
-    
-    if os.path.exists(ARQUIVO_INTERMEDIARIO): os.remove(ARQUIVO_INTERMEDIARIO)
+# Com workers > 1 os arquivos são normalizados em um pool de processos e somente este processo escreve os resultados.
+# No modo incremental apenas os arquivos cujo hash mudou em relação ao manifesto são processados novamente
+def processar_tudo(workers=None, incremental=None):
+    if workers is None: workers = ETL_WORKERS
+    if incremental is None: incremental = PROCESSAMENTO_INCREMENTAL
+    print(f"--- Iniciando Consolidação ({workers} worker(s), {'incremental' if incremental else 'completa'}) ---")
+
+    formato = resolver_formato()
+    manifesto = carregar_manifesto() if incremental else None
+
+    # Mudar o formato das partições exige reprocessar tudo
+    if manifesto is None or manifesto.get("formato", 'csv') != formato:
+        manifesto = {"versao": None, "formato": formato, "fontes": {}}
+        if os.path.exists(DIRETORIO_PARTICOES): shutil.rmtree(DIRETORIO_PARTICOES)
+    fontes_manifesto = manifesto["fontes"]
     
-    primeiro = True
-    total_linhas = 0
+    # A lista é ordenada para que a saída seja a mesma em qualquer execução, serial ou paralela
+    fontes = sorted(listar_fontes(DIRETORIO_ENTRADA), key=lambda f: (f[0], f[1] or ''))
 
-    for root, dirs, files in os.walk(DIRETORIO_ENTRADA):
-        for file in files:
-            if not file.lower().endswith(('csv', 'txt', 'xlsx')):
-                continue
+    # Arquivos que sumiram da pasta de downloads têm suas partições removidas
+    ids_atuais = {id_fonte(c, m) for c, m in fontes}
+    for fonte in [f for f in fontes_manifesto if f not in ids_atuais]:
+        print(f"   [-] Removendo dados de arquivo que não existe mais: {fonte}")
+        remover_fragmentos(fonte, fontes_manifesto.pop(fonte), formato)
 
-            caminho = os.path.join(root, file)
-            print(f" > Lendo: {file}...", end='\r')
-
-            df = carregar_arquivo(caminho)
-            
-            if df is not None:
-                df_final = normalizar_e_processar(df, caminho)
-
-                if df_final is not None and not df_final.empty:
-                    qtd = len(df_final)
-                    print(f"   [V] {qtd} registros consolidados de: {file}")
-                    
-                    modo = 'w' if primeiro else 'a'
-                    header = primeiro
-                    df_final.to_csv(ARQUIVO_INTERMEDIARIO, mode=modo, header=header, sep=';', index=False, encoding='utf-8')
-                    
-                    primeiro = False
-                    total_linhas += qtd
+    pendentes = []
+    hashes = {}
+    for caminho, membro in fontes:
+        fonte = id_fonte(caminho, membro)
+        hashes[fonte] = calcular_hash_fonte(caminho, membro)
+        if fontes_manifesto.get(fonte, {}).get("hash") != hashes[fonte]:
+            pendentes.append((caminho, membro))
+
+    print(f"   {len(pendentes)} de {len(fontes)} arquivo(s) para processar.")
+    total_pendentes = len(pendentes)
+
+    for i, ((caminho, membro), df_final) in enumerate(processar_fontes_em_ordem(pendentes, workers), start=1):
+        file = os.path.basename(nome_fonte(caminho, membro))
+        fonte = id_fonte(caminho, membro)
+
+        # Falha de leitura: as partições e a entrada anteriores do arquivo ficam como estão (sem o hash novo),
+        # então a próxima execução incremental tenta de novo
+        if df_final is FALHA_LEITURA:
+            print(f"   [X] ({i}/{total_pendentes}) Falha na leitura, mantidos os dados anteriores de: {file}")
+            continue
+
+        # Substitui as partições antigas deste arquivo pelas novas
+        if fonte in fontes_manifesto:
+            remover_fragmentos(fonte, fontes_manifesto[fonte], formato)
+
+        if df_final is not None and not df_final.empty:
+            particoes = gravar_fragmentos(fonte, df_final, formato)
+            print(f"   [V] ({i}/{total_pendentes}) {len(df_final)} registros consolidados de: {file}")
+        else:
+            particoes = {}
+            print(f"   [-] ({i}/{total_pendentes}) Nenhum registro aproveitado de: {file}")
+
+        fontes_manifesto[fonte] = {
+            "hash": hashes[fonte],
+            "linhas": sum(particoes.values()),
+            "particoes": particoes,
+            "fragmento": nome_fragmento(fonte, formato)
+        }
+        salvar_manifesto(manifesto)
+
+    versao = calcular_versao(fontes_manifesto)
+    total_linhas = sum(v["linhas"] for v in fontes_manifesto.values())
 
     if total_linhas > 0:
+        if versao == manifesto.get("versao") and os.path.exists(ARQUIVO_FINAL_ZIP):
+            print(f"\n\nNenhuma alteração desde a última execução ({total_linhas} linhas consolidadas).")
+            return
+
         print(f"\n\nSucesso! {total_linhas} linhas consolidadas.")
         print(f"Gerando arquivo final: {ARQUIVO_FINAL_ZIP}")
         
-        with zipfile.ZipFile(ARQUIVO_FINAL_ZIP, 'w', zipfile.ZIP_DEFLATED) as zf:
-            zf.write(ARQUIVO_INTERMEDIARIO, arcname='consolidado_despesas.csv')
-        
-        os.remove(ARQUIVO_INTERMEDIARIO)
+        gerar_zip_consolidado(fontes_manifesto, formato)
+        manifesto["versao"] = versao
+        salvar_manifesto(manifesto)
         print("Processo concluído.")
     else:
         print("\n[Aviso] Nenhum dado encontrado. Verifique se os arquivos foram baixados corretamente.")
 
 if __name__ == "__main__":
-    processar_tudo()
\ No newline at end of file
+    processar_tudo()
@@ -1,46 +1,188 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 import os
 import re
+import json
+import threading
 import zipfile
 
 BASE_DIR = os.getenv("BASE_DATA_DIR", "data")
-BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/"
+# A URL base pode ser sobrescrita para apontar para um servidor HTTP local que simule o FTP da ANS
+BASE_URL = os.getenv("ANS_BASE_URL", "https://dadosabertos.ans.gov.br/FTP/PDA/")
 CATEGORIA = "demonstracoes_contabeis/" 
 DIR_SAIDA = os.path.join(BASE_DIR, "downloads_ans/csv")
 
+# Configurações do motor de download
+MAX_DOWNLOADS_PARALELOS = int(os.getenv("MAX_DOWNLOADS_PARALELOS", "4"))
+TAMANHO_CHUNK = 1024 * 1024
+ARQUIVO_MANIFESTO_DOWNLOADS = os.path.join(BASE_DIR, "downloads_ans", "manifesto_downloads.json")
+SUFIXO_PARCIAL = ".part"
+
+# Por padrão os ZIPs não são extraídos: o processador lê os CSVs direto de dentro deles
+EXTRAIR_ZIPS = os.getenv("EXTRAIR_ZIPS", "false").lower() in ("1", "true", "sim")
+
+# Sessão compartilhada entre todas as threads, reaproveitando as conexões (keep-alive) do pool
+def criar_sessao():
+    sessao = requests.Session()
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504], allowed_methods=["GET", "HEAD"])
+    adapter = HTTPAdapter(pool_connections=MAX_DOWNLOADS_PARALELOS, pool_maxsize=MAX_DOWNLOADS_PARALELOS, max_retries=retry)
+    sessao.mount("http://", adapter)
+    sessao.mount("https://", adapter)
+    return sessao
+
+SESSAO = criar_sessao()
+
+# Manifesto local com ETag/Last-Modified/tamanho de cada arquivo baixado, usado para não baixar de novo o que não mudou
+class ManifestoDownloads:
+    def __init__(self, caminho=ARQUIVO_MANIFESTO_DOWNLOADS):
+        self.caminho = caminho
+        self.lock = threading.Lock()
+        self.entradas = {}
+        if os.path.exists(caminho):
+            try:
+                with open(caminho, 'r', encoding='utf-8') as f:
+                    self.entradas = json.load(f)
+            except (ValueError, OSError):
+                print(f"   [Aviso] Manifesto de downloads ilegível, será recriado.")
+
+    def obter(self, url):
+        with self.lock:
+            return self.entradas.get(url)
+
+    # Salva a cada atualização (escrita atômica), assim uma interrupção não perde o que já foi baixado
+    def registrar(self, url, etag, last_modified, tamanho):
+        with self.lock:
+            self.entradas[url] = {"etag": etag, "last_modified": last_modified, "tamanho": tamanho}
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.entradas, f, indent=2, sort_keys=True)
+            os.replace(temporario, self.caminho)
+
 #Função para obter o html da url utilizando a biblioteca beautifulsoup que irá facilitar a navegação pela estrutura
 def obter_sopa(url):
     try:
-        response = requests.get(url, timeout=30)
+        response = SESSAO.get(url, timeout=30)
         response.raise_for_status()
         return BeautifulSoup(response.text, 'html.parser')
     except requests.RequestException as e:
         print(f"   [Erro conexão]: {e}")
         return None
 
+# Monta os cabeçalhos do GET condicional (arquivo completo) ou da retomada (arquivo parcial)
+def montar_cabecalhos(entrada, caminho_local, caminho_parcial):
+    cabecalhos = {}
+    if not entrada:
+        return cabecalhos
+
+    if os.path.exists(caminho_local) and os.path.getsize(caminho_local) == entrada.get("tamanho"):
+        if entrada.get("etag"): cabecalhos["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"): cabecalhos["If-Modified-Since"] = entrada["last_modified"]
+    elif os.path.exists(caminho_parcial):
+        # If-Range garante que só retomamos se o arquivo no servidor ainda for o mesmo; caso contrário vem 200 com o arquivo inteiro
+        validador = entrada.get("etag") or entrada.get("last_modified")
+        if validador:
+            cabecalhos["Range"] = f"bytes={os.path.getsize(caminho_parcial)}-"
+            cabecalhos["If-Range"] = validador
+    return cabecalhos
+
+# Tamanho total do arquivo informado no Content-Range ("bytes */1234" na resposta 416)
+def tamanho_do_content_range(content_range):
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
 #Função responsável por baixar o arquivo
-def baixar_arquivo_unico(url, caminho_local):
+def baixar_arquivo_unico(url, caminho_local, manifesto=None):
     
     try:
         os.makedirs(os.path.dirname(caminho_local), exist_ok=True)
-        print(f"      -> Baixando arquivo direto: {os.path.basename(caminho_local)}")
+        caminho_parcial = caminho_local + SUFIXO_PARCIAL
+        entrada = manifesto.obter(url) if manifesto else None
+        cabecalhos = montar_cabecalhos(entrada, caminho_local, caminho_parcial)
         
         #Decidi baixar os arquivos em chunks, para evitar o problema de encher a memória principal e a máquina ficar lenta
-        with requests.get(url, stream=True, timeout=60) as r:
+        with SESSAO.get(url, stream=True, timeout=60, headers=cabecalhos) as r:
+            if r.status_code == 304:
+                print(f"      -> Sem alterações: {os.path.basename(caminho_local)}")
+                return True
+
+            # 416: o Range começa no fim do arquivo, ou seja, o parcial já estava completo (interrompido antes de ser renomeado)
+            if r.status_code == 416 and "Range" in cabecalhos:
+                if tamanho_do_content_range(r.headers.get("Content-Range")) == os.path.getsize(caminho_parcial):
+                    print(f"      -> Download já estava completo: {os.path.basename(caminho_local)}")
+                    os.replace(caminho_parcial, caminho_local)
+                    if manifesto:
+                        manifesto.registrar(url, entrada.get("etag"), entrada.get("last_modified"), os.path.getsize(caminho_local))
+                    return True
+                # Tamanho não confere: descarta o parcial e baixa de novo (sem o arquivo parcial não há Range)
+                print(f"      -> Parcial inválido, baixando de novo: {os.path.basename(caminho_local)}")
+                os.remove(caminho_parcial)
+                return baixar_arquivo_unico(url, caminho_local, manifesto)
             r.raise_for_status()
-            with open(caminho_local, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
+
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
+
+            # 206: o servidor aceitou o Range, continuamos de onde paramos
+            if r.status_code == 206:
+                print(f"      -> Retomando download: {os.path.basename(caminho_local)} ({os.path.getsize(caminho_parcial)} bytes já baixados)")
+                modo = 'ab'
+            else:
+                print(f"      -> Baixando arquivo direto: {os.path.basename(caminho_local)}")
+                modo = 'wb'
+
+            # O validador é registrado antes dos dados, para que um download interrompido possa ser retomado
+            if manifesto and (etag or last_modified):
+                manifesto.registrar(url, etag, last_modified, None)
+
+            with open(caminho_parcial, modo) as f:
+                for chunk in r.iter_content(chunk_size=TAMANHO_CHUNK):
                     f.write(chunk)
+
+        os.replace(caminho_parcial, caminho_local)
+        if manifesto:
+            manifesto.registrar(url, etag, last_modified, os.path.getsize(caminho_local))
         return True
     except Exception as e:
         print(f"      [Erro Download]: {e}")
         return False
 
+# Executa os downloads enfileirados em um pool limitado de threads, todas usando a mesma sessão.
+# Retorna as tarefas (url, caminho) baixadas com sucesso
+def baixar_em_paralelo(tarefas, manifesto=None, max_workers=MAX_DOWNLOADS_PARALELOS):
+    if not tarefas:
+        return []
+
+    if manifesto is None:
+        manifesto = ManifestoDownloads()
+
+    print(f"\n--- Baixando {len(tarefas)} arquivo(s) com {max_workers} conexões simultâneas ---\n")
+    concluidas = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(baixar_arquivo_unico, url, caminho, manifesto): (url, caminho) for url, caminho in tarefas}
+        for futuro in as_completed(futuros):
+            if futuro.result():
+                concluidas.append(futuros[futuro])
+
+    print(f"\nDownloads concluídos: {len(concluidas)}/{len(tarefas)}")
+    return concluidas
+
 #Função responsável por entrar nos diretórios. Recursiva até achar os arquivos finais.
-def processar_pasta_recursiva(url_diretorio, pasta_destino):
+#Os arquivos encontrados são enfileirados em 'tarefas'; sem fila, são baixados ao final da varredura.
+#Retorna False se a listagem desta pasta ou de alguma subpasta falhou
+def processar_pasta_recursiva(url_diretorio, pasta_destino, tarefas=None):
+    baixar_ao_final = tarefas is None
+    if baixar_ao_final: tarefas = []
+
     soup = obter_sopa(url_diretorio)
-    if not soup: return
+    if not soup: return False
+    listagem_completa = True
 
     if not os.path.exists(pasta_destino):
         os.makedirs(pasta_destino)
@@ -57,13 +199,17 @@ def processar_pasta_recursiva(url_diretorio, pasta_destino):
         if href.lower().endswith(('.zip', '.csv', '.pdf', '.rar')):
             print(f"      [Arquivo encontrado na pasta]: {href}")
             caminho_arquivo = os.path.join(pasta_destino, href)
-            baixar_arquivo_unico(url_completa, caminho_arquivo)
+            tarefas.append((url_completa, caminho_arquivo))
         
         # CASO B: É subpasta
         elif href.endswith('/'):
             print(f"      [Subpasta encontrada]: {href}")
             nova_pasta = os.path.join(pasta_destino, href.strip('/'))
-            processar_pasta_recursiva(url_completa, nova_pasta)
+            listagem_completa = processar_pasta_recursiva(url_completa, nova_pasta, tarefas) and listagem_completa
+
+    if baixar_ao_final:
+        baixar_em_paralelo(tarefas)
+    return listagem_completa
 
 #Função utilizada para listar os links das tags <a> que satisfaçam o regex especificado.
 def listar_links(url, padrao_regex):
@@ -79,7 +225,7 @@ def listar_links(url, padrao_regex):
     return sorted(links_encontrados, reverse=True) #Inverter a ordem para pegar dos anos mais recentes para os mais antigos
 
 
-#Função utilizada para extrair os arquivos .zip
+#Função utilizada para extrair os arquivos .zip (opcional, o processador lê os ZIPs diretamente)
 def extrair_arquivos(diretorio_alvo):
 
     if not os.path.exists(diretorio_alvo):
@@ -109,19 +255,13 @@ def extrair_arquivos(diretorio_alvo):
 
     print(f"\nConcluído! Total de arquivos extraídos: {arquivos_extraidos}")
 
-def scrapping():
-    url_categoria = BASE_URL + CATEGORIA
-    print(f"Acessando: {url_categoria}")
-
+# Percorre os trimestres do mais recente para o mais antigo, entregando cada um com os seus downloads
+# (url, caminho). É um gerador: os anos só são listados quando os trimestres anteriores não bastaram
+def candidatos_trimestres(url_categoria):
     #Obtendo os anos disponíveis
     anos = listar_links(url_categoria, r"^\d{4}/$")
-    
-    trimestres_coletados = 0
-    meta_trimestres = 3
 
     for ano in anos:
-        if trimestres_coletados >= meta_trimestres: break
-            
         print(f"\nVerificando Ano: {ano}")
         url_ano = url_categoria + ano
         
@@ -130,8 +270,6 @@ def scrapping():
         print(f"   Itens encontrados: {trimestres}")
 
         for trim in trimestres:
-            if trimestres_coletados >= meta_trimestres: break
-
             print(f"   > Processando item: {trim}")
             
             nome_sujo = trim.strip('/')
@@ -144,25 +282,50 @@ def scrapping():
             pasta_local = os.path.join(DIR_SAIDA, ano.strip('/'), nome_pasta)
             url_item = url_ano + trim
             
-            sucesso = False
-            
             # CASO A: É arquivo
             if trim.lower().endswith('.zip'):
                 caminho_final = os.path.join(pasta_local, trim)
-                sucesso = baixar_arquivo_unico(url_item, caminho_final)
+                yield trim, [(url_item, caminho_final)]
             
             # CASO B: É subpasta
             elif trim.endswith('/'):
-                processar_pasta_recursiva(url_item, pasta_local)
-                sucesso = True
+                tarefas = []
+                # Pasta que não pôde ser listada (ou vazia) não conta como trimestre: segue para o próximo
+                if processar_pasta_recursiva(url_item, pasta_local, tarefas) and tarefas:
+                    yield trim, tarefas
+                else:
+                    print(f"     [Falha na listagem]: {trim}, tentando o próximo trimestre")
             
             else:
                 print(f"     [Ignorado]: {trim}")
 
-            if sucesso:
-                trimestres_coletados += 1
+def scrapping():
+    url_categoria = BASE_URL + CATEGORIA
+    print(f"Acessando: {url_categoria}")
+
+    meta_trimestres = 3
+    coletados = []
+    candidatos = candidatos_trimestres(url_categoria)
+    manifesto = ManifestoDownloads()
+
+    # Baixa em paralelo os trimestres que faltam para a meta. Um trimestre só conta se todos os seus
+    # downloads deram certo; os que falharem são repostos pelos próximos trimestres da lista
+    while len(coletados) < meta_trimestres:
+        lote = list(islice(candidatos, meta_trimestres - len(coletados)))
+        if not lote: break
+
+        concluidas = set(baixar_em_paralelo([tarefa for _, tarefas in lote for tarefa in tarefas], manifesto))
+        for trim, tarefas in lote:
+            if tarefas and all(tarefa in concluidas for tarefa in tarefas):
+                coletados.append(trim)
+            else:
+                print(f"   [Falha no download]: {trim}, tentando o próximo trimestre")
+
+    if len(coletados) < meta_trimestres:
+        print(f"\n[Aviso] Apenas {len(coletados)} de {meta_trimestres} trimestres foram baixados.")
         
-    extrair_arquivos(DIR_SAIDA)
+    if EXTRAIR_ZIPS:
+        extrair_arquivos(DIR_SAIDA)
 
     print(f"\nProcesso Finalizado.")
 
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
 import zipfile
@@ -8,24 +9,52 @@ import warnings
 import io
 import re
 import csv
+import json
+import shutil
+import hashlib
+
+import processador
 
 # --- CONFIGURAÇÃO ---
 BASE_DIR = os.getenv("BASE_DATA_DIR", "../data")
 # Calcula o diretório pai (um nível acima de data) para salvar fora de /data
 DIR_PAI = os.path.dirname(os.path.normpath(BASE_DIR))
 
-URL_DIRETORIO_ANS = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
+# Assim como no scrapper, a URL base pode apontar para um servidor local que simule o FTP da ANS
+URL_DIRETORIO_ANS = os.getenv("ANS_BASE_URL", "https://dadosabertos.ans.gov.br/FTP/PDA/") + "operadoras_de_plano_de_saude_ativas/"
 ARQUIVO_DESPESAS_ZIP = os.path.join(BASE_DIR, "consolidado_despesas.zip")
 
+# Saídas do processador usadas no modo incremental
+ARQUIVO_MANIFESTO_PROCESSAMENTO = os.path.join(BASE_DIR, "manifesto_processamento.json")
+DIRETORIO_PARTICOES = os.path.join(BASE_DIR, "consolidado_particoes")
+
+# Relatório validado de cada partição Ano/Trimestre e o manifesto que indica de qual versão ele veio
+DIRETORIO_VALIDADO = os.path.join(BASE_DIR, "validado_particoes")
+ARQUIVO_MANIFESTO_VALIDACAO = os.path.join(BASE_DIR, "manifesto_validacao.json")
+
+VALIDACAO_INCREMENTAL = os.getenv("PROCESSAMENTO_INCREMENTAL", "false").lower() in ("1", "true", "sim")
+
+# Formato dos relatórios por partição: 'csv' ou 'parquet' (requer pyarrow). As entregas continuam em csv
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "csv").lower()
+
 # Arquivos de Saída
 ARQUIVO_ANALITICO = os.path.join(BASE_DIR, "relatorio_final_validado.csv")
 ARQUIVO_AGREGADO = os.path.join(BASE_DIR, "despesas_agregadas.csv")
+ARQUIVO_AGREGADO_PARQUET = os.path.join(BASE_DIR, "despesas_agregadas.parquet")
 NOME_ZIP_FINAL = os.path.join(BASE_DIR, "Teste_Thiago_Alves_da_Silva.zip")
 PASTA_CSV_EXTERNA = os.path.join(DIR_PAI, "csv")
 
 # Coluna utilizada para o join das tabelas
 COLUNA_ALVO_REGISTRO = "REGISTRO_OPERADORA"
 
+# Colunas do cadastro que vão para o relatório final
+COLUNAS_CADASTRO = ['CNPJ', 'Razao_Social', 'Modalidade', 'UF']
+
+# No modo streaming as despesas passam pelo join, pelas flags e pela gravação em blocos,
+# e a memória fica limitada pelo tamanho do cadastro, não pelo das despesas
+JOIN_STREAMING = os.getenv("JOIN_STREAMING", "false").lower() in ("1", "true", "sim")
+TAMANHO_CHUNK_JOIN = int(os.getenv("TAMANHO_CHUNK_JOIN", "200000"))
+
 warnings.filterwarnings("ignore")
 requests.packages.urllib3.disable_warnings()
 
@@ -34,22 +63,37 @@ def limpar_e_converter_chave(serie):
     s = serie.astype(str).str.replace(r'\D', '', regex=True)
     return pd.to_numeric(s, errors='coerce').fillna(0).astype(int)
 
+# Soma do gasto por operadora em cada trimestre. Pode ser calculada por partes e somada depois,
+# o que permite agregar o relatório sem carregá-lo inteiro em memória.
+# A soma é feita em centavos (inteiros), para que o resultado não dependa da ordem das parcelas
+# e seja o mesmo com o relatório inteiro, por blocos ou por partições
+def somar_por_trimestre(df):
+    valores = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
+
+    # Considera apenas despesas > 0
+    # Isso remove as negativas e zeradas do cálculo de média e do arquivo final agregado
+    positivas = valores > 0
+    centavos = (valores[positivas] * 100).round().astype('int64')
+    df_positivas = df[positivas].assign(ValorDespesas=centavos)
+    return df_positivas.groupby(['Razao_Social', 'UF', 'Ano', 'Trimestre'])['ValorDespesas'].sum()
+
+def acumular_somas(somas, parcial):
+    return parcial if somas is None else somas.add(parcial, fill_value=0).astype('int64')
+
 # Função para calcular os valores estatísticos pedidos
-def gerar_agregacao_estatistica(df):
+# Recebe o relatório completo (df) ou as somas por trimestre já calculadas por partes
+def gerar_agregacao_estatistica(df=None, somas_trimestrais=None):
     print("8. Calculando estatísticas por Operadora/UF...")
     
-    df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
+    if somas_trimestrais is None:
+        somas_trimestrais = somar_por_trimestre(df)
     
-    # Cria um dataframe temporário contendo apenas despesas > 0
-    # Isso remove as negativas e zeradas do cálculo de média e do arquivo final agregado
-    df_positivas = df[df['ValorDespesas'] > 0].copy()
-    
-    if df_positivas.empty:
+    if somas_trimestrais.empty:
         print("   Aviso: Nenhuma despesa positiva encontrada para agregação.")
         return pd.DataFrame(columns=['Razao_Social', 'UF', 'Valor_Total', 'Media_Trimestral', 'Desvio_Padrao'])
 
-    # Soma do gasto por trimestre
-    df_trimestral = df_positivas.groupby(['Razao_Social', 'UF', 'Ano', 'Trimestre'])['ValorDespesas'].sum().reset_index()
+    # Centavos de volta para reais
+    df_trimestral = (somas_trimestrais / 100).reset_index()
 
     # Valor total por operadora, Média trimestral por operadora e desvio padrão
     df_agg = df_trimestral.groupby(['Razao_Social', 'UF'])['ValorDespesas'].agg(
@@ -97,13 +141,54 @@ def validar_digitos_cnpj(cnpj):
     d2 = 0 if (soma2 % 11) < 2 else 11 - (soma2 % 11)
     return str(d1) == cnpj[12] and str(d2) == cnpj[13]
 
-def aplicar_validacoes(df):
-    print("6. Calculando flags de inconsistência...")
+PESOS_CNPJ_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_CNPJ_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+# Versão vetorizada de validar_digitos_cnpj para uma coluna inteira, com exatamente o mesmo resultado.
+# A coluna vira uma matriz de dígitos (uma linha por cnpj) e os dois dígitos verificadores são
+# calculados com produto de matrizes, em vez de duas somas em Python por linha
+def validar_digitos_cnpj_vetorizado(serie):
+    texto = serie.map(str).reset_index(drop=True)
+
+    # Remove a formatação apenas onde ela existe
+    digitos = texto.copy()
+    formatados = ~texto.str.isdigit().to_numpy(dtype=bool)
+    if formatados.any():
+        digitos[formatados] = texto[formatados].str.replace(r'\D', '', regex=True)
+
+    # Completa com zeros à esquerda; os raros casos com mais de 14 caracteres ficam para a função original
+    comprimento = digitos.str.len().to_numpy()
+    curtos = comprimento < 14
+    if curtos.any():
+        digitos[curtos] = digitos[curtos].str.zfill(14)
+    longos = comprimento > 14
+    if longos.any():
+        digitos[longos] = '0' * 14
+
+    matriz = np.array(digitos.tolist(), dtype='<U14').view(np.uint32).reshape(-1, 14).astype(np.int64) - ord('0')
+
+    # Dígitos unicode fora do ASCII também são raros e usam a função original
+    fora_padrao = ((matriz < 0) | (matriz > 9)).any(axis=1) | longos
+
+    resto1 = (matriz[:, :12] @ PESOS_CNPJ_1) % 11
+    d1 = np.where(resto1 < 2, 0, 11 - resto1)
+    resto2 = (matriz[:, :13] @ PESOS_CNPJ_2) % 11
+    d2 = np.where(resto2 < 2, 0, 11 - resto2)
+
+    todos_iguais = (matriz == matriz[:, :1]).all(axis=1)
+    validos = (d1 == matriz[:, 12]) & (d2 == matriz[:, 13]) & ~todos_iguais
+
+    for i in np.flatnonzero(fora_padrao):
+        validos[i] = validar_digitos_cnpj(texto[i])
+
+    return pd.Series(validos, index=serie.index)
+
+def aplicar_validacoes(df, exibir_etapas=True):
+    if exibir_etapas: print("6. Calculando flags de inconsistência...")
     
     # 1. Flag CNPJ Inválido (True = Erro)
-    df['FLAG_CNPJ_INVALIDO'] = df['CNPJ'].apply(
-        lambda x: True if "NAO" in str(x) else (not validar_digitos_cnpj(x))
-    )
+    df['FLAG_CNPJ_INVALIDO'] = df['CNPJ'].map(str).str.contains("NAO", regex=False).to_numpy() \
+        | ~validar_digitos_cnpj_vetorizado(df['CNPJ']).to_numpy()
 
     # 2. Flag Razão Social Inválida (True = Erro)
     df['FLAG_RAZAO_SOCIAL_INVALIDA'] = df['Razao_Social'].apply(
@@ -140,36 +225,12 @@ def baixar_cadastro():
         return caminho
     except: return None
 
-def executar_pipeline():
-    # Cria a pasta CSV externa se não existir
-    if not os.path.exists(PASTA_CSV_EXTERNA): os.makedirs(PASTA_CSV_EXTERNA)
-
-    # Baixa o cadastro
-    caminho_cad = baixar_cadastro()
-    if not caminho_cad:
-        files = glob.glob(os.path.join(PASTA_CSV_EXTERNA, "*.csv"))
-        caminho_cad = files[0] if files else None
-
-    if not caminho_cad:
-        print("Erro Fatal: Nenhum arquivo de cadastro encontrado.")
-        return
-
-    print("2. Carregando tabelas...")
-    try:
-        with zipfile.ZipFile(ARQUIVO_DESPESAS_ZIP, 'r') as z:
-            with z.open(z.namelist()[0]) as f:
-                texto = io.TextIOWrapper(f, encoding='utf-8')
-                df_despesas = pd.read_csv(f, sep=';', encoding='utf-8')
-                # Salva o dataframe de despesas bruto na pasta CSV externa, fora de /data
-                df_despesas.to_csv(os.path.join(PASTA_CSV_EXTERNA, "consolidado_despesas.csv"), index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
-
-    except Exception as e:
-        print(f"Erro despesas: {e}"); return
-
+# Lê o cadastro, encontra as colunas utilizadas e deixa a tabela indexada pela chave do join
+def carregar_cadastro(caminho_cad):
     try:
         df_cadastro = pd.read_csv(caminho_cad, sep=';', encoding='latin1', on_bad_lines='skip', dtype=str)
     except Exception as e:
-        print(f"Erro cadastro: {e}"); return
+        print(f"Erro cadastro: {e}"); return None
 
     # Mapeamento das colunas 
     print("3. Mapeando colunas...")
@@ -179,21 +240,17 @@ def executar_pipeline():
               next((c for c in df_cadastro.columns if 'DATA' not in c and 'REGISTRO' in c and 'OPERADORA' in c), None)
 
     if not col_reg:
-        print(f"Erro: Coluna '{COLUNA_ALVO_REGISTRO}' não encontrada."); return
+        print(f"Erro: Coluna '{COLUNA_ALVO_REGISTRO}' não encontrada."); return None
 
     col_uf = next((c for c in df_cadastro.columns if c == 'UF' or 'ESTADO' in c or 'SIGLA' in c), None)
     
     # Limpeza da chave que será utilizaada para o join
-    df_despesas['REG_ANS'] = limpar_e_converter_chave(df_despesas['REG_ANS'])
     df_cadastro[col_reg] = limpar_e_converter_chave(df_cadastro[col_reg])
     
     # Caso possua registro de operadora duplicado, irá descartar um deles
     print("4. Deduplicando cadastro...")
     df_cadastro.drop_duplicates(subset=[col_reg], keep='first', inplace=True)
 
-    print("5. Cruzando tabelas...")
-    df_final = df_despesas.join(df_cadastro.set_index(COLUNA_ALVO_REGISTRO), on="REG_ANS")
-
     renomear = {}
     col_cnpj = next((c for c in df_cadastro.columns if 'CNPJ' in c), None)
     col_razao = next((c for c in df_cadastro.columns if 'RAZAO' in c or 'NOME' in c), None)
@@ -203,17 +260,26 @@ def executar_pipeline():
     if col_razao: renomear[col_razao] = 'Razao_Social'
     if col_mod: renomear[col_mod] = 'Modalidade'
     if col_uf: renomear[col_uf] = 'UF'
-    
-    df_final.rename(columns=renomear, inplace=True)
+
+    # Índice compacto: somente a chave e as colunas que vão para o relatório
+    df_cadastro = df_cadastro.set_index(col_reg).rename(columns=renomear)
+    return df_cadastro[[c for c in COLUNAS_CADASTRO if c in df_cadastro.columns]]
+
+# Cruza as despesas com o cadastro, preenche o que não foi encontrado e cria as flags
+def enriquecer_despesas(df_despesas, df_cadastro, exibir_etapas=True):
+    df_despesas['REG_ANS'] = limpar_e_converter_chave(df_despesas['REG_ANS'])
+
+    if exibir_etapas: print("5. Cruzando tabelas...")
+    df_final = df_despesas.join(df_cadastro, on="REG_ANS")
     
     df_final['Razao_Social'].fillna("RAZAO SOCIAL NAO LOCALIZADA", inplace=True)
     df_final['UF'].fillna("INDETERMINADO", inplace=True)
     df_final['CNPJ'].fillna("NAO ENCONTRADO", inplace=True)
 
     # Cria as flags
-    df_final = aplicar_validacoes(df_final)
+    df_final = aplicar_validacoes(df_final, exibir_etapas)
 
-    print("7. Selecionando colunas finais...")
+    if exibir_etapas: print("7. Selecionando colunas finais...")
     colunas_desejadas = [
         'REG_ANS', 'CNPJ', 'Razao_Social', 'Modalidade', 'UF', 
         'Trimestre', 'Ano', 'ValorDespesas',
@@ -223,14 +289,239 @@ def executar_pipeline():
     for c in colunas_desejadas:
         if c not in df_final.columns: df_final[c] = pd.NA
             
-    df_final = df_final[colunas_desejadas]
-    
-    # Salva o relatório final
-    df_final.to_csv(ARQUIVO_ANALITICO, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+    return df_final[colunas_desejadas]
+
+def hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def carregar_json(caminho, padrao):
+    if os.path.exists(caminho):
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            pass
+    return padrao
+
+def salvar_json(caminho, conteudo):
+    temporario = caminho + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, indent=2, sort_keys=True)
+    os.replace(temporario, caminho)
+
+# O formato parquet depende do pyarrow; caso ele não esteja instalado, volta para csv
+def resolver_formato():
+    if FORMATO_SAIDA == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            print("   [Aviso] pyarrow não está instalado, os relatórios serão gravados em csv.")
+            return 'csv'
+        return 'parquet'
+    return 'csv'
+
+def ler_tabela(caminho):
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_csv(caminho, sep=';', encoding='utf-8')
+
+# Tipos das colunas do relatório validado gravado em parquet
+def tipar_relatorio(df):
+    tipos = {c: 'string' for c in ['CNPJ', 'Razao_Social', 'Modalidade', 'UF', 'Trimestre']}
+    tipos.update({'REG_ANS': 'int64', 'Ano': 'Int64', 'ValorDespesas': 'float64'})
+    tipos.update({c: 'bool' for c in ['FLAG_CNPJ_INVALIDO', 'FLAG_RAZAO_SOCIAL_INVALIDA', 'FLAG_VALOR_INVALIDO']})
+    return df.astype(tipos)
+
+# Concatena tabelas em um único csv no formato das entregas, uma de cada vez.
+# Tabelas em csv já estão no formato final e são copiadas byte a byte
+def concatenar_em_csv(caminhos, destino_csv):
+    primeiro = True
+    with open(destino_csv, 'wb') as destino:
+        for caminho in caminhos:
+            if caminho.endswith('.parquet'):
+                texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+                pd.read_parquet(caminho).to_csv(texto, header=primeiro, index=False, sep=';', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+                texto.detach()
+                primeiro = False
+                continue
+
+            with open(caminho, 'rb') as origem:
+                cabecalho = origem.readline()
+                if primeiro:
+                    destino.write(cabecalho)
+                    primeiro = False
+                shutil.copyfileobj(origem, destino)
+
+# A partir do manifesto do processador, lista os fragmentos de cada partição e uma assinatura que muda
+# sempre que algum arquivo de origem da partição muda
+def mapear_particoes(manifesto_processamento):
+    formato = manifesto_processamento.get("formato") or 'csv'
+    fragmentos = {}
+    assinaturas = {}
+    for fonte in sorted(manifesto_processamento.get("fontes", {})):
+        entrada = manifesto_processamento["fontes"][fonte]
+        nome = processador.fragmento_da_entrada(fonte, entrada, formato)
+        for particao in entrada.get("particoes", {}):
+            fragmentos.setdefault(particao, []).append(os.path.join(DIRETORIO_PARTICOES, particao, nome))
+            assinaturas.setdefault(particao, []).append(entrada["hash"])
+    assinaturas = {p: hashlib.sha256("|".join(h).encode('utf-8')).hexdigest()[:16] for p, h in assinaturas.items()}
+    return fragmentos, assinaturas
+
+def caminho_validado(particao, formato='csv'):
+    return os.path.join(DIRETORIO_VALIDADO, particao.replace('/', '_') + "." + formato)
+
+# Valida as partições novas ou alteradas desde a última execução (todas, se o cadastro ou o formato mudou,
+# ou se 'reiniciar' for informado) e monta o relatório final juntando os relatórios de cada partição
+def validar_particoes(df_cadastro, hash_cadastro, manifesto_processamento, formato='csv', reiniciar=False):
+    fragmentos, assinaturas = mapear_particoes(manifesto_processamento)
+    estado = carregar_json(ARQUIVO_MANIFESTO_VALIDACAO, {"cadastro": None, "particoes": {}})
+
+    if reiniciar or estado.get("cadastro") != hash_cadastro or estado.get("formato", 'csv') != formato:
+        if estado.get("cadastro") and not reiniciar: print("   Cadastro ou formato alterado: todas as partições serão validadas novamente.")
+        estado = {"cadastro": hash_cadastro, "formato": formato, "particoes": {}}
+        if os.path.exists(DIRETORIO_VALIDADO): shutil.rmtree(DIRETORIO_VALIDADO)
+    os.makedirs(DIRETORIO_VALIDADO, exist_ok=True)
+
+    # Partições que deixaram de existir no consolidado
+    for particao in [p for p in estado["particoes"] if p not in assinaturas]:
+        if os.path.exists(caminho_validado(particao, formato)): os.remove(caminho_validado(particao, formato))
+        del estado["particoes"][particao]
+
+    for particao in sorted(assinaturas):
+        destino = caminho_validado(particao, formato)
+        if estado["particoes"].get(particao) == assinaturas[particao] and os.path.exists(destino):
+            continue
+
+        print(f"   > Validando partição {particao}...")
+        df_despesas = pd.concat([ler_tabela(f) for f in fragmentos[particao]], ignore_index=True)
+        df_particao = enriquecer_despesas(df_despesas, df_cadastro)
+        if formato == 'parquet':
+            tipar_relatorio(df_particao).to_parquet(destino, index=False)
+        else:
+            df_particao.to_csv(destino, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+
+        estado["particoes"][particao] = assinaturas[particao]
+        salvar_json(ARQUIVO_MANIFESTO_VALIDACAO, estado)
+
+    salvar_json(ARQUIVO_MANIFESTO_VALIDACAO, estado)
+
+    # Relatório final: concatenação dos relatórios das partições, sem reprocessá-los
+    validados = [caminho_validado(p, formato) for p in sorted(assinaturas)]
+    concatenar_em_csv(validados, ARQUIVO_ANALITICO)
+
+    # Cada trimestre está inteiro em uma partição, então somar partição por partição dá o mesmo resultado
+    # que somar o relatório completo, mantendo em memória apenas uma partição por vez
+    somas = None
+    for caminho in validados:
+        somas = acumular_somas(somas, somar_por_trimestre(ler_tabela(caminho)))
+    return somas if somas is not None else pd.Series(dtype='int64')
+
+# Lê o consolidado_despesas.zip em blocos, salvando cada bloco na cópia da pasta CSV externa
+def ler_consolidado_em_blocos(caminho_consolidado_externo):
+    with zipfile.ZipFile(ARQUIVO_DESPESAS_ZIP, 'r') as z:
+        with z.open(z.namelist()[0]) as f:
+            primeiro = True
+            for bloco in pd.read_csv(f, sep=';', encoding='utf-8', chunksize=TAMANHO_CHUNK_JOIN):
+                bloco.to_csv(caminho_consolidado_externo, mode='w' if primeiro else 'a', header=primeiro, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+                primeiro = False
+                yield bloco
+
+# Join em streaming: cada bloco de despesas é cruzado com o cadastro (que fica inteiro em memória),
+# validado e anexado ao relatório final. Para a agregação são guardadas apenas as somas por trimestre
+def validar_em_blocos(df_cadastro, blocos):
+    somas = None
+    primeiro = True
+    print("5. Cruzando tabelas em blocos...")
+    for i, bloco in enumerate(blocos, start=1):
+        df_bloco = enriquecer_despesas(bloco, df_cadastro, exibir_etapas=False)
+        df_bloco.to_csv(ARQUIVO_ANALITICO, mode='w' if primeiro else 'a', header=primeiro, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+        somas = acumular_somas(somas, somar_por_trimestre(df_bloco))
+        primeiro = False
+        print(f"   > Bloco {i}: {len(df_bloco)} despesas validadas")
+    return somas if somas is not None else pd.Series(dtype='int64')
+
+# Com o modo incremental ou o formato parquet, a validação é feita sobre as partições do processador.
+# Caso contrário, sobre o consolidado_despesas.zip completo, em memória ou em blocos (streaming)
+def executar_pipeline(incremental=None, streaming=None):
+    if incremental is None: incremental = VALIDACAO_INCREMENTAL
+    if streaming is None: streaming = JOIN_STREAMING
+    formato = resolver_formato()
+
+    # Cria a pasta CSV externa se não existir
+    if not os.path.exists(PASTA_CSV_EXTERNA): os.makedirs(PASTA_CSV_EXTERNA)
+
+    # Baixa o cadastro
+    caminho_cad = baixar_cadastro()
+    if not caminho_cad:
+        files = glob.glob(os.path.join(PASTA_CSV_EXTERNA, "*.csv"))
+        caminho_cad = files[0] if files else None
+
+    if not caminho_cad:
+        print("Erro Fatal: Nenhum arquivo de cadastro encontrado.")
+        return
+
+    usar_particoes = incremental or formato == 'parquet'
+    manifesto_processamento = carregar_json(ARQUIVO_MANIFESTO_PROCESSAMENTO, None) if usar_particoes else None
+    if usar_particoes and not manifesto_processamento:
+        print("   [Aviso] Manifesto do processamento não encontrado, executando validação completa.")
+        incremental = usar_particoes = False
+        formato = 'csv'
+
+    print("2. Carregando tabelas...")
+    caminho_consolidado_externo = os.path.join(PASTA_CSV_EXTERNA, "consolidado_despesas.csv")
+    estado = carregar_json(ARQUIVO_MANIFESTO_VALIDACAO, {}) if incremental else {}
+    copia_atualizada = incremental and estado.get("versao_despesas") == manifesto_processamento.get("versao") \
+        and os.path.exists(caminho_consolidado_externo)
+
+    df_despesas = None
+    if copia_atualizada or (streaming and not usar_particoes):
+        pass
+    elif usar_particoes:
+        # Salva as despesas consolidadas na pasta CSV externa a partir das partições, uma de cada vez
+        # (as em parquet são convertidas), sem ler o consolidado inteiro em memória
+        fragmentos, _ = mapear_particoes(manifesto_processamento)
+        concatenar_em_csv([f for p in sorted(fragmentos) for f in fragmentos[p]], caminho_consolidado_externo)
+    else:
+        try:
+            with zipfile.ZipFile(ARQUIVO_DESPESAS_ZIP, 'r') as z:
+                with z.open(z.namelist()[0]) as f:
+                    df_despesas = pd.read_csv(f, sep=';', encoding='utf-8')
+                    # Salva o dataframe de despesas bruto na pasta CSV externa, fora de /data
+                    df_despesas.to_csv(caminho_consolidado_externo, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+
+        except Exception as e:
+            print(f"Erro despesas: {e}"); return
+
+    df_cadastro = carregar_cadastro(caminho_cad)
+    if df_cadastro is None:
+        return
+
+    if usar_particoes:
+        somas = validar_particoes(df_cadastro, hash_arquivo(caminho_cad), manifesto_processamento, formato, reiniciar=not incremental)
+        estado = carregar_json(ARQUIVO_MANIFESTO_VALIDACAO, {})
+        estado["versao_despesas"] = manifesto_processamento.get("versao")
+        salvar_json(ARQUIVO_MANIFESTO_VALIDACAO, estado)
+        df_agregado = gerar_agregacao_estatistica(somas_trimestrais=somas)
+    elif streaming:
+        try:
+            somas = validar_em_blocos(df_cadastro, ler_consolidado_em_blocos(caminho_consolidado_externo))
+        except Exception as e:
+            print(f"Erro despesas: {e}"); return
+        df_agregado = gerar_agregacao_estatistica(somas_trimestrais=somas)
+    else:
+        df_final = enriquecer_despesas(df_despesas, df_cadastro)
+        # Salva o relatório final
+        df_final.to_csv(ARQUIVO_ANALITICO, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+        df_agregado = gerar_agregacao_estatistica(df_final)
 
-    # Gera e salva a agregação
-    df_agregado = gerar_agregacao_estatistica(df_final)
+    # Salva a agregação
     df_agregado.to_csv(ARQUIVO_AGREGADO, index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
+    if formato == 'parquet':
+        df_agregado.to_parquet(ARQUIVO_AGREGADO_PARQUET, index=False)
     
     # Salva o arquivo de despesas agregadas na pasta CSV externa
     df_agregado.to_csv(os.path.join(PASTA_CSV_EXTERNA, "despesas_agregadas.csv"), index=False, sep=';', encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, quotechar='"')
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Verificação do motor de download do scrapper contra um servidor HTTP local que simula o FTP da ANS,
+# com ETag, GET condicional (304), Range/If-Range (206) e 416.
+# Uso: python verificar_downloads.py
+
+DIR_TESTE = tempfile.mkdtemp(prefix="verificar_downloads_")
+os.environ["BASE_DATA_DIR"] = DIR_TESTE
+
+import scrapper  # noqa: E402 (BASE_DATA_DIR precisa estar definido antes da importação)
+
+CATEGORIA = "/" + scrapper.CATEGORIA
+
+
+# Arquivos servidos (caminho -> bytes) e os arquivos ou pastas que respondem 404 mesmo aparecendo na listagem
+ARQUIVOS = {}
+QUEBRADOS = set()
+# Status de cada requisição recebida, para conferir o que o scrapper pediu
+RESPOSTAS = []
+
+
+def conteudo_zip(nome, tamanho):
+    caminho = os.path.join(DIR_TESTE, "origem.zip")
+    with zipfile.ZipFile(caminho, 'w') as zf:
+        zf.writestr(nome.replace(".zip", ".csv"), os.urandom(tamanho).hex())
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def etag_de(dados):
+    return '"' + hashlib.sha1(dados).hexdigest() + '"'
+
+
+class ServidorANS(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def responder(self, status, corpo=b"", cabecalhos=None):
+        RESPOSTAS.append((self.path, status))
+        self.send_response(status)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    # Listagem no formato do índice do Apache usado pela ANS
+    def listar(self, diretorio):
+        filhos = set()
+        for caminho in ARQUIVOS:
+            if caminho.startswith(diretorio) and caminho != diretorio:
+                resto = caminho[len(diretorio):]
+                filhos.add(resto.split("/", 1)[0] + ("/" if "/" in resto else ""))
+        links = "".join(f'<a href="{filho}">{filho}</a>\n' for filho in sorted(filhos))
+        return f'<html><body><a href="../">../</a>\n{links}</body></html>'.encode()
+
+    def do_GET(self):
+        if self.path in QUEBRADOS:
+            self.responder(404)
+            return
+        if self.path.endswith("/"):
+            self.responder(200, self.listar(self.path), {"Content-Type": "text/html"})
+            return
+        if self.path not in ARQUIVOS:
+            self.responder(404)
+            return
+
+        dados = ARQUIVOS[self.path]
+        etag = etag_de(dados)
+        cabecalhos = {"ETag": etag, "Last-Modified": formatdate(0, usegmt=True), "Accept-Ranges": "bytes"}
+
+        if self.headers.get("If-None-Match") == etag:
+            self.responder(304, cabecalhos=cabecalhos)
+            return
+
+        faixa = self.headers.get("Range")
+        if faixa and self.headers.get("If-Range", etag) == etag:
+            inicio = int(faixa.split("=", 1)[1].rstrip("-"))
+            if inicio >= len(dados):
+                self.responder(416, cabecalhos={**cabecalhos, "Content-Range": f"bytes */{len(dados)}"})
+                return
+            cabecalhos["Content-Range"] = f"bytes {inicio}-{len(dados) - 1}/{len(dados)}"
+            self.responder(206, dados[inicio:], cabecalhos)
+            return
+
+        self.responder(200, dados, cabecalhos)
+
+
+def status_de(arquivo):
+    return [status for caminho, status in RESPOSTAS if caminho == arquivo]
+
+
+def conferir(descricao, condicao):
+    print(f"   [{'OK' if condicao else 'FALHOU'}] {descricao}")
+    return condicao
+
+
+def main():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ServidorANS)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    scrapper.BASE_URL = f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+    for ano, trimestre in [("2025", 3), ("2025", 2), ("2025", 1), ("2024", 4)]:
+        ARQUIVOS[f"{CATEGORIA}{ano}/{trimestre}T{ano}.zip"] = conteudo_zip(f"{trimestre}T{ano}.zip", 200_000)
+
+    url_3t = CATEGORIA + "2025/3T2025.zip"
+    url_2t = CATEGORIA + "2025/2T2025.zip"
+    # Trimestre mais recente em uma subpasta cuja listagem falha
+    ARQUIVOS[CATEGORIA + "2025/4T2025/4T2025.zip"] = conteudo_zip("4T2025.zip", 1000)
+    pasta_4t = CATEGORIA + "2025/4T2025/"
+    local_3t = os.path.join(scrapper.DIR_SAIDA, "2025", "3T2025", "3T2025.zip")
+    parcial_3t = local_3t + scrapper.SUFIXO_PARCIAL
+    resultados = []
+
+    try:
+        print("\n=== 1. Trimestres com listagem ou download quebrados são repostos pelos seguintes ===")
+        QUEBRADOS.update([url_2t, pasta_4t])
+        scrapper.scrapping()
+        baixados = sorted(arquivo for _, _, arquivos in os.walk(scrapper.DIR_SAIDA) for arquivo in arquivos)
+        resultados.append(conferir("3 trimestres baixados, sem 4T2025 e 2T2025", baixados == ["1T2025.zip", "3T2025.zip", "4T2024.zip"]))
+        QUEBRADOS.clear()
+
+        manifesto = scrapper.ManifestoDownloads()
+        RESPOSTAS.clear()
+
+        print("\n=== 2. Arquivo sem alterações: GET condicional ===")
+        resultados.append(conferir("download confirmado", scrapper.baixar_arquivo_unico(scrapper.BASE_URL + url_3t[1:], local_3t, manifesto)))
+        resultados.append(conferir("servidor respondeu 304", status_de(url_3t) == [304]))
+
+        print("\n=== 3. Download interrompido: retomada com Range/If-Range ===")
+        os.replace(local_3t, parcial_3t)
+        with open(parcial_3t, 'r+b') as f:
+            f.truncate(len(ARQUIVOS[url_3t]) // 3)
+        RESPOSTAS.clear()
+        scrapper.baixar_arquivo_unico(scrapper.BASE_URL + url_3t[1:], local_3t, manifesto)
+        resultados.append(conferir("servidor respondeu 206", status_de(url_3t) == [206]))
+        with open(local_3t, 'rb') as f:
+            resultados.append(conferir("arquivo retomado igual ao do servidor", f.read() == ARQUIVOS[url_3t]))
+
+        print("\n=== 4. Parcial já completo: 416 promove o arquivo ===")
+        os.replace(local_3t, parcial_3t)
+        RESPOSTAS.clear()
+        resultados.append(conferir("download confirmado", scrapper.baixar_arquivo_unico(scrapper.BASE_URL + url_3t[1:], local_3t, manifesto)))
+        resultados.append(conferir("servidor respondeu 416", status_de(url_3t) == [416]))
+        resultados.append(conferir("parcial promovido", os.path.exists(local_3t) and not os.path.exists(parcial_3t)))
+
+        print("\n=== 5. Arquivo mudou no servidor: If-Range não confere e vem o arquivo inteiro ===")
+        os.replace(local_3t, parcial_3t)
+        with open(parcial_3t, 'r+b') as f:
+            f.truncate(1000)
+        ARQUIVOS[url_3t] = conteudo_zip("3T2025.zip", 150_000)
+        RESPOSTAS.clear()
+        scrapper.baixar_arquivo_unico(scrapper.BASE_URL + url_3t[1:], local_3t, manifesto)
+        resultados.append(conferir("servidor respondeu 200", status_de(url_3t) == [200]))
+        with open(local_3t, 'rb') as f:
+            resultados.append(conferir("arquivo novo baixado por inteiro", f.read() == ARQUIVOS[url_3t]))
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(DIR_TESTE, ignore_errors=True)
+
+    print(f"\n{sum(resultados)}/{len(resultados)} verificações passaram.")
+    return 0 if all(resultados) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
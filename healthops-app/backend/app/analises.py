@@ -0,0 +1,171 @@
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import func, and_, true, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.future import select
+
+from . import models
+
+# Consultas das análises (/api/analises), as mesmas de queries_analiticas, sobre a visão materializada
+# mv_despesas_operadora_periodo: uma linha por operadora e trimestre, já somada, em vez das despesas brutas.
+# O período é filtrado pela chave numérica periodo (ano * 10 + trimestre), que usa o índice da visão
+PADRAO_PERIODO = re.compile(r"^([1-4])T(\d{4})$", re.IGNORECASE)
+# Máximo de operadoras comparadas em uma mesma série de despesas
+MAX_OPERADORAS_SERIE = 50
+
+mv = models.DespesaOperadoraPeriodo
+
+
+# Converte "1T2025" na chave 20251
+def chave_do_periodo(texto):
+    encontrado = PADRAO_PERIODO.match(texto.strip())
+    if not encontrado:
+        raise HTTPException(status_code=422, detail=f"Período inválido: '{texto}'. Use o formato 1T2025")
+    trimestre, ano = encontrado.groups()
+    return int(ano) * 10 + int(trimestre)
+
+# Converte a chave 20251 em "1T2025"
+def periodo_da_chave(chave):
+    return f"{chave % 10}T{chave // 10}" if chave is not None else None
+
+# Filtro do intervalo de períodos pedido (inclusivo nas duas pontas)
+def filtro_periodo(inicio, fim):
+    condicoes = []
+    if inicio is not None:
+        condicoes.append(mv.periodo >= inicio)
+    if fim is not None:
+        condicoes.append(mv.periodo <= fim)
+    return and_(true(), *condicoes)
+
+# Converte os parâmetros periodo_inicio/periodo_fim das rotas
+def intervalo(periodo_inicio, periodo_fim):
+    inicio = chave_do_periodo(periodo_inicio) if periodo_inicio else None
+    fim = chave_do_periodo(periodo_fim) if periodo_fim else None
+    if inicio is not None and fim is not None and inicio > fim:
+        raise HTTPException(status_code=422, detail="periodo_inicio deve ser anterior ou igual a periodo_fim")
+    return inicio, fim
+
+# Primeiro e último trimestre com dados dentro do intervalo
+async def limites_com_dados(db, inicio, fim):
+    result = await db.execute(select(func.min(mv.periodo), func.max(mv.periodo)).where(filtro_periodo(inicio, fim)))
+    return result.one()
+
+# Operadoras com maior crescimento percentual entre o primeiro e o último trimestre do intervalo.
+# Como em crescimento_percentual.sql, ficam de fora as que não têm despesas em uma das pontas
+async def crescimento(db, inicio, fim, limite):
+    primeiro, ultimo = await limites_com_dados(db, inicio, fim)
+    resposta = {"periodo_inicial": periodo_da_chave(primeiro), "periodo_final": periodo_da_chave(ultimo), "operadoras": []}
+    if primeiro is None:
+        return resposta
+
+    inicial = select(mv.registro_operadora, mv.total).where(mv.periodo == primeiro, mv.total > 0).subquery()
+    final = select(mv.registro_operadora, mv.total).where(mv.periodo == ultimo, mv.total > 0).subquery()
+    percentual = func.round((final.c.total - inicial.c.total) / inicial.c.total * 100, 2)
+
+    query = select(
+        models.Operadora.registro_operadora,
+        models.Operadora.razao_social,
+        inicial.c.total.label("valor_inicial"),
+        final.c.total.label("valor_final"),
+        percentual.label("crescimento_percentual")
+    )\
+    .join(final, final.c.registro_operadora == inicial.c.registro_operadora)\
+    .join(models.Operadora, models.Operadora.registro_operadora == inicial.c.registro_operadora)\
+    .order_by(percentual.desc(), models.Operadora.registro_operadora)\
+    .limit(limite)
+
+    resposta["operadoras"] = (await db.execute(query)).all()
+    return resposta
+
+# Operadoras que ficaram acima da média do mercado em pelo menos 'minimo_trimestres' trimestres do intervalo
+async def acima_media(db, inicio, fim, minimo_trimestres, limite):
+    primeiro, ultimo = await limites_com_dados(db, inicio, fim)
+    filtro = filtro_periodo(inicio, fim)
+
+    media = select(mv.periodo, func.avg(mv.total).label("media_geral"))\
+        .where(filtro)\
+        .group_by(mv.periodo)\
+        .subquery()
+
+    acima = select(mv.registro_operadora, func.count().label("trimestres_acima"))\
+        .join(media, media.c.periodo == mv.periodo)\
+        .where(filtro, mv.total > media.c.media_geral)\
+        .group_by(mv.registro_operadora)\
+        .having(func.count() >= minimo_trimestres)\
+        .subquery()
+
+    qtd = (await db.execute(select(func.count()).select_from(acima))).scalar_one()
+
+    query = select(acima.c.registro_operadora, models.Operadora.razao_social, acima.c.trimestres_acima)\
+        .join(models.Operadora, models.Operadora.registro_operadora == acima.c.registro_operadora)\
+        .order_by(acima.c.trimestres_acima.desc(), acima.c.registro_operadora)\
+        .limit(limite)
+
+    return {
+        "periodo_inicial": periodo_da_chave(primeiro),
+        "periodo_final": periodo_da_chave(ultimo),
+        "minimo_trimestres": minimo_trimestres,
+        "qtd_operadoras": qtd,
+        "operadoras": (await db.execute(query)).all()
+    }
+
+# UFs com maiores despesas no intervalo, com a quantidade de operadoras e a média por operadora
+async def despesas_por_uf(db, inicio, fim, limite):
+    primeiro, ultimo = await limites_com_dados(db, inicio, fim)
+    total = func.sum(mv.total)
+    qtd = func.count(func.distinct(mv.registro_operadora))
+
+    query = select(
+        mv.uf,
+        total.label("despesas_totais"),
+        qtd.label("qtd_operadoras"),
+        func.round(total / func.nullif(qtd, 0), 2).label("media_por_operadora")
+    )\
+    .where(filtro_periodo(inicio, fim))\
+    .group_by(mv.uf)\
+    .order_by(total.desc())\
+    .limit(limite)
+
+    return {
+        "periodo_inicial": periodo_da_chave(primeiro),
+        "periodo_final": periodo_da_chave(ultimo),
+        "ufs": (await db.execute(query)).all()
+    }
+
+# Série de despesas por trimestre de cada operadora pedida (/api/despesas/serie), somada na visão.
+# Uma única consulta para todas as operadoras; operadora sem despesas no intervalo vem com a série vazia
+async def serie_despesas(db, registros, inicio, fim):
+    stmt = select(
+        models.Operadora.registro_operadora,
+        models.Operadora.razao_social,
+        mv.periodo,
+        mv.ano,
+        mv.trimestre,
+        mv.total
+    )\
+    .outerjoin(mv, and_(mv.registro_operadora == models.Operadora.registro_operadora, filtro_periodo(inicio, fim)))\
+    .where(models.Operadora.registro_operadora == any_(bindparam("registros", list(registros), type_=ARRAY(String))))\
+    .order_by(models.Operadora.registro_operadora, mv.periodo)
+
+    result = await db.execute(stmt)
+    series = {}
+    for linha in result.all():
+        operadora = series.setdefault(linha.registro_operadora, {
+            "registro_operadora": linha.registro_operadora,
+            "razao_social": linha.razao_social,
+            "serie": []
+        })
+        if linha.periodo is not None:
+            operadora["serie"].append({
+                "periodo": periodo_da_chave(linha.periodo),
+                "ano": linha.ano,
+                "trimestre": linha.trimestre,
+                "valor_despesas": linha.total
+            })
+
+    # Na ordem em que as operadoras foram pedidas, para a comparação lado a lado
+    return {
+        "operadoras": [series[registro] for registro in registros if registro in series],
+        "nao_encontrados": [registro for registro in registros if registro not in series]
+    }
@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import exc
+from sqlalchemy.future import select
+
+from . import models, database, serializacao
+
+# Cache das respostas da API em memória (LRU), limitado em quantidade de itens e em bytes.
+# As entradas pertencem a uma versão dos dados (tabela versao_dados, incrementada pelo carregador a cada carga):
+# quando a versão muda, o cache inteiro é descartado
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "64")) * 1024 * 1024
+# Intervalo mínimo, em segundos, entre duas consultas da versão dos dados no banco
+CACHE_INTERVALO_VERSAO = float(os.getenv("CACHE_INTERVALO_VERSAO", "10"))
+# Cada worker escuta o canal em que o carregador publica (NOTIFY) a nova versão ao fim de cada carga,
+# e descarta o cache assim que ela chega. Enquanto a escuta está conectada, a consulta periódica
+# da versão vira só uma garantia e usa o intervalo maior abaixo
+CACHE_NOTIFICACOES = os.getenv("CACHE_NOTIFICACOES", "true").lower() in ("1", "true", "sim")
+CACHE_INTERVALO_VERSAO_ESCUTA = float(os.getenv("CACHE_INTERVALO_VERSAO_ESCUTA", "300"))
+# Mesmo canal usado pelo carregador (data_scripts/carregador.py)
+CANAL_VERSAO = "versao_dados"
+
+
+class CacheRespostas:
+    def __init__(self, max_itens, max_bytes):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self.versao = None
+
+    def obter(self, chave, versao):
+        if versao != self.versao:
+            self.limpar(versao)
+            return None
+        entrada = self.itens.get(chave)
+        if entrada is not None:
+            self.itens.move_to_end(chave)
+        return entrada
+
+    def guardar(self, chave, versao, corpo):
+        if versao != self.versao:
+            self.limpar(versao)
+        etag = '"%s-%s"' % (versao, hashlib.sha1(corpo).hexdigest()[:16])
+        entrada = (etag, corpo)
+
+        # Respostas maiores que o limite inteiro não são guardadas
+        if len(corpo) > self.max_bytes:
+            return entrada
+
+        if chave in self.itens:
+            self.bytes -= len(self.itens.pop(chave)[1])
+        self.itens[chave] = entrada
+        self.bytes += len(corpo)
+
+        # Remove as menos usadas recentemente até voltar aos limites
+        while len(self.itens) > self.max_itens or self.bytes > self.max_bytes:
+            _, (_, antigo) = self.itens.popitem(last=False)
+            self.bytes -= len(antigo)
+        return entrada
+
+    def limpar(self, versao=None):
+        self.itens.clear()
+        self.bytes = 0
+        self.versao = versao
+
+
+CACHE = CacheRespostas(CACHE_MAX_ITENS, CACHE_MAX_BYTES)
+
+_versao_dados = {"valor": None, "consultada_em": 0.0, "lock": None, "escuta_ativa": False}
+# Funções chamadas quando a versão dos dados muda (ex: reconstrução do painel de estatísticas)
+_ouvintes_versao = []
+
+def ao_mudar_versao(funcao):
+    if funcao not in _ouvintes_versao:
+        _ouvintes_versao.append(funcao)
+    return funcao
+
+# Registra a versão; quando ela muda, descarta o cache de respostas e avisa os ouvintes
+def _definir_versao(versao):
+    anterior = _versao_dados["valor"]
+    _versao_dados["valor"] = versao
+    _versao_dados["consultada_em"] = time.monotonic()
+
+    if anterior is not None and anterior != versao:
+        CACHE.limpar(versao)
+        for funcao in _ouvintes_versao:
+            funcao(versao)
+
+def _intervalo_versao():
+    return CACHE_INTERVALO_VERSAO_ESCUTA if _versao_dados["escuta_ativa"] else CACHE_INTERVALO_VERSAO
+
+# Erros de consulta da versão que não devem derrubar as rotas em cache: erros do banco e falhas de conexão
+# (DNS, conexão recusada, timeout ao conectar ou ao esperar uma conexão do pool)
+ERROS_CONSULTA_VERSAO = (exc.DBAPIError, exc.TimeoutError, OSError, asyncio.TimeoutError)
+# SQLSTATE de tabela inexistente (undefined_table)
+TABELA_INEXISTENTE = "42P01"
+
+# Versão atual dos dados. É consultada no banco no máximo uma vez a cada CACHE_INTERVALO_VERSAO segundos
+async def obter_versao():
+    if time.monotonic() - _versao_dados["consultada_em"] < _intervalo_versao():
+        return _versao_dados["valor"]
+
+    # Criado aqui, e não na importação, para ficar associado ao event loop do servidor
+    if _versao_dados["lock"] is None:
+        _versao_dados["lock"] = asyncio.Lock()
+
+    async with _versao_dados["lock"]:
+        if time.monotonic() - _versao_dados["consultada_em"] >= _intervalo_versao():
+            try:
+                async with database.AsyncSessionLocal() as session:
+                    versao = (await session.execute(select(models.VersaoDados.versao))).scalar()
+            except ERROS_CONSULTA_VERSAO as e:
+                if getattr(getattr(e, "orig", None), "sqlstate", None) == TABELA_INEXISTENTE:
+                    # Banco criado antes da tabela versao_dados: o cache só expira ao reiniciar a API
+                    versao = None
+                else:
+                    # Falha passageira: continua com a versão conhecida (e o cache) e tenta de novo no próximo
+                    # intervalo, sem tratar a falha como mudança de versão
+                    print(f"Não foi possível consultar a versão dos dados: {e!r}")
+                    _versao_dados["consultada_em"] = time.monotonic()
+                    return _versao_dados["valor"]
+            _definir_versao(0 if versao is None else versao)
+    return _versao_dados["valor"]
+
+# Força a próxima requisição a consultar a versão no banco
+def expirar_versao():
+    _versao_dados["consultada_em"] = 0.0
+
+# Notificação do carregador com a nova versão (conteúdo do NOTIFY)
+def receber_versao(conteudo):
+    try:
+        _definir_versao(int(conteudo))
+    except ValueError:
+        expirar_versao()
+
+# Estado da conexão de escuta. Ao (re)conectar, a versão é consultada de novo,
+# porque notificações enviadas enquanto a escuta estava desconectada se perderam
+def escuta_conectada(ativa):
+    _versao_dados["escuta_ativa"] = ativa
+    expirar_versao()
+
+# Chave do cache: rota e parâmetros já convertidos pelo FastAPI (valores padrão preenchidos e tipos
+# convertidos, então "page=01" e "page=1" são a mesma chave). A busca ignora caixa e espaços extras
+def montar_chave(nome_rota, parametros):
+    normalizados = []
+    for nome, valor in sorted(parametros.items()):
+        if nome in ("db", "request"):
+            continue
+        if isinstance(valor, str):
+            valor = " ".join(valor.split())
+            if nome == "search":
+                valor = valor.lower()
+        elif isinstance(valor, list):
+            valor = tuple(valor)
+        normalizados.append((nome, valor))
+    return (nome_rota, tuple(normalizados))
+
+# Responde 304 quando o navegador já possui a mesma versão (If-None-Match)
+def montar_resposta(request, etag, corpo, status_cache):
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": status_cache}
+    if etag in [e.strip() for e in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
+
+# Decorator das rotas em cache. A rota precisa declarar o parâmetro 'request: Request';
+# o resultado é validado e serializado com o mesmo modelo do response_model.
+# Com validar=False a rota já devolve dicionários no formato do modelo, que vão direto para o orjson
+def em_cache(modelo, validar=True):
+    adaptador = TypeAdapter(modelo)
+
+    def serializar(resultado):
+        if not validar:
+            return serializacao.para_json(resultado)
+        return adaptador.dump_json(adaptador.validate_python(resultado, from_attributes=True))
+
+    def decorador(rota):
+        @functools.wraps(rota)
+        async def envoltorio(*args, **kwargs):
+            request: Request = kwargs["request"]
+            versao = await obter_versao()
+            chave = montar_chave(rota.__name__, kwargs)
+
+            entrada = CACHE.obter(chave, versao)
+            if entrada is not None:
+                return montar_resposta(request, *entrada, "HIT")
+
+            resultado = await rota(*args, **kwargs)
+            corpo = serializar(resultado)
+            etag, corpo = CACHE.guardar(chave, versao, corpo)
+            return montar_resposta(request, etag, corpo, "MISS")
+
+        return envoltorio
+    return decorador
@@ -1,10 +1,100 @@
+import asyncio
 import os
+import time
+from collections import deque
+
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://postgres:Postgres2018!@db:5432/ans_db")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# --- POOL DE CONEXÕES ---
+# Cada worker do uvicorn tem o seu próprio pool: o máximo de conexões no banco é
+# (DB_POOL_TAMANHO + DB_POOL_EXTRA) vezes a quantidade de workers
+DB_POOL_TAMANHO = int(os.getenv("DB_POOL_TAMANHO", "5"))
+# Conexões extras abertas sob demanda quando todas as do pool estão em uso, fechadas ao serem devolvidas
+DB_POOL_EXTRA = int(os.getenv("DB_POOL_EXTRA", "10"))
+# Segundos que uma requisição espera por uma conexão livre antes de falhar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões mais antigas que isso (segundos) são reabertas no próximo uso; -1 desativa
+DB_POOL_RECICLAR = int(os.getenv("DB_POOL_RECICLAR", "1800"))
+# Testa a conexão (ida e volta ao banco) antes de entregá-la; útil quando o banco ou a rede derrubam conexões ociosas
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "sim")
+# Consultas preparadas guardadas por conexão (cache do driver asyncpg). 0 desativa, necessário atrás do pgbouncer em modo transação
+DB_CACHE_CONSULTAS = int(os.getenv("DB_CACHE_CONSULTAS", "100"))
+# Quantidade de tempos de checkout guardados para os percentis do diagnóstico
+AMOSTRAS_CHECKOUT = 1000
+
+
+# Pool que mede o tempo de cada checkout (espera por uma conexão livre, abertura de conexão nova e pre-ping)
+# e quantas requisições estão aguardando uma conexão no momento
+class PoolMonitorado(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aguardando = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.tempos_checkout = deque(maxlen=AMOSTRAS_CHECKOUT)
+
+    def connect(self):
+        inicio = time.perf_counter()
+        self.aguardando += 1
+        try:
+            conexao = super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.aguardando -= 1
+        self.checkouts += 1
+        self.tempos_checkout.append(time.perf_counter() - inicio)
+        return conexao
+
+    def estatisticas(self):
+        tempos = sorted(self.tempos_checkout)
+
+        def percentil(p):
+            return round(tempos[min(len(tempos) - 1, int(len(tempos) * p))] * 1000, 3) if tempos else None
+
+        return {
+            "pid": os.getpid(),
+            "tamanho": self.size(),
+            "extra_maximo": self._max_overflow,
+            "em_uso": self.checkedout(),
+            "ociosas": self.checkedin(),
+            # Negativo enquanto o pool ainda não abriu todas as conexões do tamanho base
+            "extras_abertas": self.overflow(),
+            "aguardando": self.aguardando,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "checkout_ms": {
+                "amostras": len(tempos),
+                "p50": percentil(0.50),
+                "p95": percentil(0.95),
+                "p99": percentil(0.99),
+                "max": round(tempos[-1] * 1000, 3) if tempos else None
+            }
+        }
+
+
+argumentos_conexao = {"prepared_statement_cache_size": DB_CACHE_CONSULTAS}
+if DB_CACHE_CONSULTAS == 0:
+    # Desativa também o cache interno do asyncpg
+    argumentos_conexao["statement_cache_size"] = 0
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=PoolMonitorado,
+    pool_size=DB_POOL_TAMANHO,
+    max_overflow=DB_POOL_EXTRA,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECICLAR,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=argumentos_conexao
+)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -20,4 +110,54 @@ async def get_db():
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+# Estado do pool deste worker (o engine pode recriar o pool, então é sempre lido do engine)
+def estatisticas_pool():
+    estatisticas = engine.sync_engine.pool.estatisticas()
+    estatisticas["configuracao"] = {
+        "timeout": DB_POOL_TIMEOUT,
+        "reciclar": DB_POOL_RECICLAR,
+        "pre_ping": DB_POOL_PRE_PING,
+        "cache_consultas": DB_CACHE_CONSULTAS
+    }
+    return estatisticas
+
+# Escuta (LISTEN) um canal de notificações do Postgres com uma conexão do engine, mantida aberta
+# enquanto a API estiver no ar (ocupa uma conexão do pool). ao_notificar recebe o conteúdo de cada NOTIFY;
+# ao_conectar(True/False) é chamado quando a escuta conecta ou cai. Se a conexão cair, tenta de novo
+ESPERA_RECONEXAO_ESCUTA = 5
+
+async def manter_escuta(canal, ao_notificar, ao_conectar):
+    while True:
+        try:
+            async with engine.connect() as conexao:
+                bruta = (await conexao.get_raw_connection()).driver_connection
+                perdida = asyncio.Event()
+
+                def ao_perder(_conexao):
+                    perdida.set()
+
+                def ao_receber(_conexao, _pid, _canal, conteudo):
+                    ao_notificar(conteudo)
+
+                bruta.add_termination_listener(ao_perder)
+                await bruta.add_listener(canal, ao_receber)
+                ao_conectar(True)
+                print(f"Escutando notificações no canal '{canal}'")
+                try:
+                    await perdida.wait()
+                finally:
+                    ao_conectar(False)
+                    bruta.remove_termination_listener(ao_perder)
+                    # A conexão volta para o pool: sem isso ela continuaria recebendo as notificações.
+                    # Se caiu, é descartada para que o pool não a entregue para outra requisição
+                    if bruta.is_closed():
+                        await conexao.invalidate()
+                    else:
+                        await bruta.remove_listener(canal, ao_receber)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Escuta do canal '{canal}' interrompida: {e}")
+        await asyncio.sleep(ESPERA_RECONEXAO_ESCUTA)
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import os
+import zlib
+
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.future import select
+
+from . import models, database
+
+# Exportação completa de despesas_consolidadas com os dados da operadora, em NDJSON ou CSV.
+# As linhas são lidas por um cursor no servidor (stream + yield_per) e enviadas em blocos conforme chegam,
+# então a memória da API não cresce com o tamanho da exportação
+TAMANHO_LOTE_EXPORTACAO = int(os.getenv("TAMANHO_LOTE_EXPORTACAO", "5000"))
+
+COLUNAS_EXPORTACAO = [
+    "registro_operadora", "cnpj", "razao_social", "modalidade", "uf", "ano", "trimestre", "valor_despesas"
+]
+
+
+# Consulta da exportação com os filtros já validados pela rota.
+# O período é filtrado também pelo ano, para que só as partições envolvidas sejam lidas
+def montar_consulta(inicio, fim, uf, modalidade):
+    despesa = models.DespesaConsolidada
+    operadora = models.Operadora
+
+    query = select(
+        operadora.registro_operadora,
+        operadora.cnpj,
+        operadora.razao_social,
+        operadora.modalidade,
+        operadora.uf,
+        despesa.ano,
+        despesa.trimestre,
+        despesa.valor_despesas
+    ).join(operadora, operadora.registro_operadora == despesa.registro_operadora)
+
+    periodo = despesa.ano * 10 + cast(func.left(despesa.trimestre, 1), Integer)
+    if inicio is not None:
+        query = query.where(despesa.ano >= inicio // 10, periodo >= inicio)
+    if fim is not None:
+        query = query.where(despesa.ano <= fim // 10, periodo <= fim)
+    if uf:
+        query = query.where(operadora.uf == uf.strip().upper())
+    if modalidade:
+        query = query.where(operadora.modalidade == modalidade.strip())
+    return query
+
+def formatar_ndjson(linhas):
+    return "".join(json.dumps(dict(zip(COLUNAS_EXPORTACAO, linha)), ensure_ascii=False, default=str) + "\n" for linha in linhas)
+
+# Mesmo separador dos CSVs gerados pelo pipeline
+def formatar_csv(linhas, cabecalho=False):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    if cabecalho:
+        escritor.writerow(COLUNAS_EXPORTACAO)
+    escritor.writerows(linhas)
+    return buffer.getvalue()
+
+# Gerador do corpo da resposta. Usa uma sessão própria, que vive enquanto a resposta é enviada
+# (a sessão da dependência get_db pode ser fechada antes do fim do streaming)
+async def gerar_exportacao(query, formato, compactar):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compactar else None
+
+    def codificar(texto):
+        dados = texto.encode("utf-8")
+        return compressor.compress(dados) if compressor else dados
+
+    if formato == "csv":
+        yield codificar(formatar_csv([], cabecalho=True))
+
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+        async for linhas in result.partitions():
+            bloco = codificar(formatar_csv(linhas) if formato == "csv" else formatar_ndjson(linhas))
+            if bloco:
+                yield bloco
+
+    if compressor:
+        yield compressor.flush()
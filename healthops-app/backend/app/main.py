@@ -1,14 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, or_
-from typing import List
-from async_lru import alru_cache
+from sqlalchemy import func, or_, cast, Text, String, tuple_, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from typing import List, Optional
+import asyncio
+import base64
+import json
+import re
+from contextlib import asynccontextmanager
 
-from . import models, schemas, database
+from . import models, schemas, database, cache, painel, analises, exportacao, metricas, serializacao
 
-app = FastAPI(title="API ANS")
+# Na inicialização monta o painel de estatísticas; depois ele é reconstruído a cada nova versão dos dados.
+# A escuta das notificações do carregador faz cada worker descartar o cache logo após uma carga
+@asynccontextmanager
+async def lifespan(app):
+    cache.ao_mudar_versao(painel.agendar_atualizacao)
+    try:
+        await painel.atualizar_painel()
+    except Exception as e:
+        # Banco ainda indisponível: o painel é montado na primeira requisição
+        print(f"Painel de estatísticas não foi montado na inicialização: {e}")
+
+    escuta = None
+    if cache.CACHE_NOTIFICACOES:
+        escuta = asyncio.ensure_future(database.manter_escuta(cache.CANAL_VERSAO, cache.receber_versao, cache.escuta_conectada))
+    yield
+    if escuta:
+        escuta.cancel()
+        try:
+            await escuta
+        except asyncio.CancelledError:
+            pass
+
+app = FastAPI(title="API ANS", lifespan=lifespan)
+
+# Latência por rota e tempo das consultas SQL, expostos em /metrics
+metricas.instrumentar(database.engine)
+app.add_middleware(metricas.MiddlewareMetricas)
 
 origins = [
     "http://localhost:3001", 
@@ -24,47 +56,201 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Termos menores que um trigrama não conseguem usar os índices de busca
+TAMANHO_MINIMO_BUSCA = 3
+
+def escapar_like(termo):
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Monta o filtro e a ordenação da busca. Termos só com dígitos e pontuação de CNPJ buscam no CNPJ (e no Registro ANS);
+# os demais buscam na razão social e no nome fantasia normalizados (minúsculas, sem acento),
+# ordenando pela similaridade com o termo. Ambos usam os índices de trigramas do script.sql
+def montar_busca(search):
+    termo = search.strip()
+    digitos = re.sub(r"\D", "", termo)
+
+    if digitos and re.fullmatch(r"[\d\s./-]+", termo):
+        if len(digitos) < TAMANHO_MINIMO_BUSCA:
+            raise HTTPException(status_code=422, detail=f"A busca precisa ter pelo menos {TAMANHO_MINIMO_BUSCA} caracteres")
+        cnpj = cast(models.Operadora.cnpj, Text)
+        filtro = cnpj.like(f"%{digitos}%")
+        # Até 6 dígitos também pode ser o Registro ANS, que é buscado pela chave primária
+        if len(digitos) <= 6:
+            filtro = or_(filtro, models.Operadora.registro_operadora == digitos.zfill(6))
+        return filtro, [(models.Operadora.registro_operadora == digitos.zfill(6)).desc(), cnpj]
+
+    if len(termo) < TAMANHO_MINIMO_BUSCA:
+        raise HTTPException(status_code=422, detail=f"A busca precisa ter pelo menos {TAMANHO_MINIMO_BUSCA} caracteres")
+
+    normalizado = func.normalizar_texto(termo)
+    razao = func.normalizar_texto(models.Operadora.razao_social)
+    fantasia = func.normalizar_texto(models.Operadora.nome_fantasia)
+    padrao = func.concat("%", func.normalizar_texto(escapar_like(termo)), "%")
+
+    filtro = or_(razao.like(padrao), fantasia.like(padrao))
+    relevancia = func.greatest(
+        func.word_similarity(normalizado, razao),
+        func.coalesce(func.word_similarity(normalizado, fantasia), 0)
+    )
+    return filtro, [relevancia.desc(), func.similarity(razao, normalizado).desc(), models.Operadora.razao_social]
+
+# Remove a pontuação de CNPJ. Usada na busca por identificador e nas rotas em lote
+def normalizar_identificador(identificador):
+    return identificador.strip().replace(".", "").replace("/", "").replace("-", "")
+
+# Filtro por Registro ANS ou CNPJ para uma lista de identificadores já normalizados.
+# A lista vai em um único parâmetro do tipo array ('= ANY(...)'), qualquer que seja o tamanho do lote
+def filtro_identificadores(identificadores):
+    lista = bindparam("identificadores", list(identificadores), type_=ARRAY(String))
+    return or_(models.Operadora.registro_operadora == any_(lista), models.Operadora.cnpj == any_(lista))
+
+# Colunas das respostas das rotas de listagem, na ordem dos campos dos schemas (caminho rápido de serializacao.py)
+CAMPOS_OPERADORA = list(schemas.OperadoraBase.model_fields)
+COLUNAS_OPERADORA = serializacao.colunas_do_schema(models.Operadora, schemas.OperadoraBase)
+CAMPOS_DESPESA = list(schemas.DespesaResponse.model_fields)
+
+# Na contagem 'auto', abaixo dessa estimativa de linhas o count(*) exato é barato o suficiente
+LIMITE_CONTAGEM_EXATA = 10000
+
+# Cursor opaco da paginação por cursor: direção ('n' próxima, 'p' anterior) e a chave (razao_social, registro_operadora)
+# da última linha vista, em JSON codificado em base64
+def codificar_cursor(direcao, operadora):
+    conteudo = json.dumps([direcao, operadora.razao_social, operadora.registro_operadora], ensure_ascii=False)
+    return base64.urlsafe_b64encode(conteudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decodificar_cursor(cursor):
+    try:
+        direcao, razao_social, registro = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if direcao not in ("n", "p"):
+            raise ValueError(direcao)
+        # A chave vai direto para o WHERE: tipos diferentes virariam erro do banco (500) em vez de 400
+        if not isinstance(razao_social, str) or not isinstance(registro, str):
+            raise ValueError(cursor)
+        return direcao, razao_social, registro
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+# Estimativa do planner para a quantidade de linhas da consulta (EXPLAIN), sem executá-la
+async def estimar_linhas(db, query):
+    conn = await db.connection()
+    compilado = query.compile(dialect=conn.dialect)
+    parametros = compilado.construct_params()
+    resultado = await conn.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + compilado.string,
+        tuple(parametros[nome] for nome in compilado.positiontup),
+        execution_options={"consulta": "estimativa"}
+    )
+    plano = resultado.scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+# Total de linhas conforme o modo de contagem pedido. Retorna (total, modo usado)
+async def contar(db, query, contagem):
+    if contagem == "nenhuma":
+        return None, "nenhuma"
+
+    if contagem in ("estimada", "auto"):
+        estimativa = await estimar_linhas(db, query)
+        if contagem == "estimada" or estimativa > LIMITE_CONTAGEM_EXATA:
+            return estimativa, "estimada"
+
+    total = await db.execute(select(func.count()).select_from(query.subquery()).execution_options(consulta="contagem"))
+    return total.scalar_one(), "exata"
+
 # 1. Rota de Listagem com Busca e Paginação + Metadados
+# Dois modos de paginação: 'offset' (page/limit, ordenado pela relevância da busca) e 'cursor'
+# (keyset em (razao_social, registro_operadora), com tokens next/prev), cujo custo não cresce com a profundidade da página
 @app.get("/api/operadoras", response_model=schemas.PaginatedResponse)
-@alru_cache(maxsize=1, ttl=3600)
+@cache.em_cache(schemas.PaginatedResponse, validar=False)
 async def listar_operadoras(
+    request: Request,
     search: str = Query(None, description="Busca por Razão Social ou CNPJ"),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    paginacao: str = Query("offset", pattern="^(offset|cursor)$", description="offset ou cursor"),
+    cursor: Optional[str] = Query(None, description="Token next_cursor/prev_cursor da resposta anterior (paginação por cursor)"),
+    contagem: Optional[str] = Query(None, pattern="^(auto|exata|estimada|nenhuma)$",
+                                    description="auto: exata quando a estimativa é pequena; exata; estimada; nenhuma. "
+                                                "Padrão: exata no modo offset, auto no modo cursor"),
     db: AsyncSession = Depends(database.get_db)
 ):
-    skip = (page - 1) * limit
-    
-    query = select(models.Operadora)
+    # No modo offset o total define a quantidade de páginas, então por padrão continua exato
+    if contagem is None:
+        contagem = "auto" if paginacao == "cursor" or cursor else "exata"
+
+    # Só as colunas da resposta, sem montar objetos do ORM
+    query = select(*COLUNAS_OPERADORA)
+    ordenacao = []
     
-    if search:
-        search_term = f"%{search}%"
-        query = query.where(
-            or_(
-                models.Operadora.razao_social.ilike(search_term),
-                models.Operadora.cnpj.ilike(search_term)
-            )
-        )
+    if search and search.strip():
+        filtro, ordenacao = montar_busca(search)
+        query = query.where(filtro)
     
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar_one()
+    total, tipo_contagem = await contar(db, query, contagem)
+
+    if paginacao == "cursor" or cursor:
+        return await paginar_por_cursor(db, query, cursor, limit, total, tipo_contagem)
+
+    skip = (page - 1) * limit
 
-    result = await db.execute(query.offset(skip).limit(limit))
-    operadoras = result.scalars().all()
+    # Desempate pela chave, para que a paginação seja estável
+    query = query.order_by(*ordenacao, models.Operadora.registro_operadora)
+    result = await db.execute(query.offset(skip).limit(limit).execution_options(consulta="pagina"))
 
     return {
-        "data": operadoras,
+        "data": serializacao.linhas_para_dicts(result.all(), CAMPOS_OPERADORA),
         "total": total,
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "contagem": tipo_contagem,
+        "next_cursor": None,
+        "prev_cursor": None
+    }
+
+# Busca uma linha a mais que o limite para saber se existe outra página na mesma direção.
+# A página anterior é lida em ordem inversa a partir da primeira linha da página atual e depois desinvertida
+async def paginar_por_cursor(db, query, cursor, limit, total, tipo_contagem):
+    chave = tuple_(models.Operadora.razao_social, models.Operadora.registro_operadora)
+    direcao = "n"
+
+    if cursor:
+        direcao, razao_social, registro = decodificar_cursor(cursor)
+        valor = tuple_(razao_social, registro)
+        query = query.where(chave > valor if direcao == "n" else chave < valor)
+
+    if direcao == "n":
+        query = query.order_by(models.Operadora.razao_social, models.Operadora.registro_operadora)
+    else:
+        query = query.order_by(models.Operadora.razao_social.desc(), models.Operadora.registro_operadora.desc())
+
+    result = await db.execute(query.limit(limit + 1).execution_options(consulta="pagina"))
+    operadoras = result.all()
+    tem_mais = len(operadoras) > limit
+    operadoras = operadoras[:limit]
+
+    if direcao == "p":
+        operadoras.reverse()
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, cursor is not None
+
+    return {
+        "data": serializacao.linhas_para_dicts(operadoras, CAMPOS_OPERADORA),
+        "total": total,
+        "page": None,
+        "limit": limit,
+        "contagem": tipo_contagem,
+        "next_cursor": codificar_cursor("n", operadoras[-1]) if operadoras and tem_proxima else None,
+        "prev_cursor": codificar_cursor("p", operadoras[0]) if operadoras and tem_anterior else None
     }
 
 # 2. Busca por CNPJ ou Registro
 @app.get("/api/operadoras/{identificador}", response_model=schemas.OperadoraBase)
-async def detalhar_operadora(identificador: str, db: AsyncSession = Depends(database.get_db)):
+@cache.em_cache(schemas.OperadoraBase)
+async def detalhar_operadora(request: Request, identificador: str, db: AsyncSession = Depends(database.get_db)):
     # Tenta buscar por Registro ANS (6 dígitos) OU CNPJ (14 dígitos)
-    identificador_limpo = identificador.replace(".", "").replace("/", "").replace("-", "")
+    identificador_limpo = normalizar_identificador(identificador)
     
     stmt = select(models.Operadora).where(
         or_(
@@ -81,57 +267,187 @@ async def detalhar_operadora(identificador: str, db: AsyncSession = Depends(data
 
 # 3. Histórico de Despesas
 @app.get("/api/operadoras/{registro}/despesas", response_model=List[schemas.DespesaResponse])
-async def listar_despesas(registro: str, db: AsyncSession = Depends(database.get_db)):
+@cache.em_cache(List[schemas.DespesaResponse], validar=False)
+async def listar_despesas(request: Request, registro: str, db: AsyncSession = Depends(database.get_db)):
 
     registro_formatado = registro.strip().zfill(6)
     
-    stmt = select(models.DespesaConsolidada).where(
-        models.DespesaConsolidada.registro_operadora == registro
+    # Seleciona só as colunas do índice idx_despesas_operadora_periodo, para que a consulta seja um index-only scan
+    stmt = select(
+        models.DespesaConsolidada.trimestre,
+        models.DespesaConsolidada.ano,
+        models.DespesaConsolidada.valor_despesas
+    ).where(
+        models.DespesaConsolidada.registro_operadora == registro_formatado
     ).order_by(models.DespesaConsolidada.ano.desc(), models.DespesaConsolidada.trimestre.desc())
     
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return serializacao.linhas_para_dicts(result.all(), CAMPOS_DESPESA)
 
-# 4. Estatísticas Agregadas
-@app.get("/api/estatisticas", response_model=schemas.DashboardResponse)
-async def ver_estatisticas(db: AsyncSession = Depends(database.get_db)):
-    
-    # 1. Valor total e média
-    query_geral = select(
-        func.sum(models.DespesaAgregada.valor_total),
-        func.avg(models.DespesaAgregada.valor_total)
-    )
-    result_geral = await db.execute(query_geral)
-    total_geral, media_geral = result_geral.one()
-
-    if total_geral is None:
-        total_geral = 0
-    if media_geral is None:
-        media_geral = 0
-
-    # 2. Top 5 Operadoras
-    query_top5 = select(models.DespesaAgregada)\
-        .order_by(models.DespesaAgregada.valor_total.desc())\
-        .limit(5)
-    result_top5 = await db.execute(query_top5)
-    top_5 = result_top5.scalars().all()
-
-    # 3. Distribuição por UF
-    query_uf = select(
-        models.DespesaAgregada.uf,
-        func.sum(models.DespesaAgregada.valor_total).label("total")
+# 3.1. Operadoras em lote
+# Resolve até TAMANHO_MAX_LOTE identificadores (CNPJ ou Registro ANS) com uma única consulta
+@app.post("/api/operadoras/lote", response_model=schemas.LoteOperadorasResponse)
+async def detalhar_operadoras_lote(lote: schemas.LoteIdentificadores, db: AsyncSession = Depends(database.get_db)):
+    normalizados = {original: normalizar_identificador(original) for original in lote.identificadores}
+
+    result = await db.execute(select(models.Operadora).where(filtro_identificadores(set(normalizados.values()))))
+    por_chave = {}
+    for op in result.scalars().all():
+        por_chave[op.registro_operadora] = op
+        por_chave[op.cnpj] = op
+
+    resultados = {original: por_chave.get(chave) for original, chave in normalizados.items()}
+    return {
+        "resultados": resultados,
+        "nao_encontrados": [original for original, op in resultados.items() if op is None]
+    }
+
+# 3.2. Histórico de despesas em lote
+# Uma única consulta para todas as operadoras do lote, agrupada por operadora na resposta.
+# Operadora encontrada sem despesas vem com lista vazia; identificador não encontrado vem com null
+@app.post("/api/operadoras/lote/despesas", response_model=schemas.LoteDespesasResponse)
+async def listar_despesas_lote(lote: schemas.LoteIdentificadores, db: AsyncSession = Depends(database.get_db)):
+    normalizados = {original: normalizar_identificador(original) for original in lote.identificadores}
+
+    stmt = select(
+        models.Operadora.registro_operadora,
+        models.Operadora.cnpj,
+        models.DespesaConsolidada.trimestre,
+        models.DespesaConsolidada.ano,
+        models.DespesaConsolidada.valor_despesas
     )\
-    .group_by(models.DespesaAgregada.uf)\
-    .order_by(func.sum(models.DespesaAgregada.valor_total).desc())
-    
-    result_uf = await db.execute(query_uf)
+    .outerjoin(models.DespesaConsolidada, models.DespesaConsolidada.registro_operadora == models.Operadora.registro_operadora)\
+    .where(filtro_identificadores(set(normalizados.values())))\
+    .order_by(models.Operadora.registro_operadora, models.DespesaConsolidada.ano.desc(), models.DespesaConsolidada.trimestre.desc())
 
-    # Transforma o resultado (que vem como tuplas) em uma lista de dicionários
-    lista_uf = [{"uf": row.uf if row.uf else "N/A", "total": row.total} for row in result_uf.all()]
+    result = await db.execute(stmt)
+    historicos = {}
+    for linha in result.all():
+        historico = historicos.setdefault(linha.registro_operadora, [])
+        historicos[linha.cnpj] = historico
+        if linha.ano is not None:
+            historico.append({"trimestre": linha.trimestre, "ano": linha.ano, "valor_despesas": linha.valor_despesas})
 
+    resultados = {original: historicos.get(chave) for original, chave in normalizados.items()}
     return {
-        "total_despesas": total_geral,
-        "media_despesas": media_geral,
-        "top_5_operadoras": top_5,
-        "despesas_por_uf": lista_uf
-    }
\ No newline at end of file
+        "resultados": resultados,
+        "nao_encontrados": [original for original, historico in resultados.items() if historico is None]
+    }
+
+# 3.3. Série de despesas por trimestre
+# Um total por ano/trimestre, somado no banco, de uma ou mais operadoras (registros=300568,416428 ou
+# registros repetido na query string), para gráficos e comparação entre operadoras
+@app.get("/api/despesas/serie", response_model=schemas.SerieDespesasResponse)
+@cache.em_cache(schemas.SerieDespesasResponse, validar=False)
+async def listar_serie_despesas(
+    request: Request,
+    registros: List[str] = Query(..., description="Registros ANS, separados por vírgula ou repetidos"),
+    periodo_inicio: Optional[str] = Query(None, description="Primeiro trimestre, ex: 1T2024"),
+    periodo_fim: Optional[str] = Query(None, description="Último trimestre, ex: 3T2025"),
+    db: AsyncSession = Depends(database.get_db)
+):
+    # Mesmo formato de registro_operadora (6 dígitos), sem repetidos e na ordem pedida
+    normalizados = []
+    for valor in registros:
+        for registro in valor.split(","):
+            registro = registro.strip()
+            if registro and registro.zfill(6) not in normalizados:
+                normalizados.append(registro.zfill(6))
+
+    if not normalizados:
+        raise HTTPException(status_code=422, detail="Informe ao menos um registro ANS")
+    if len(normalizados) > analises.MAX_OPERADORAS_SERIE:
+        raise HTTPException(status_code=422, detail=f"No máximo {analises.MAX_OPERADORAS_SERIE} operadoras por série")
+
+    inicio, fim = analises.intervalo(periodo_inicio, periodo_fim)
+    return await analises.serie_despesas(db, normalizados, inicio, fim)
+
+# 4. Estatísticas Agregadas
+# Servidas a partir do snapshot montado em painel.py, sem consulta ao banco
+@app.get("/api/estatisticas", response_model=schemas.DashboardResponse)
+async def ver_estatisticas(request: Request):
+    # A consulta periódica da versão dispara a reconstrução do painel quando chega uma nova carga
+    versao = await cache.obter_versao()
+    snapshot = await painel.obter_painel()
+    # Snapshot de uma versão anterior (a reconstrução falhou ou a versão mudou durante ela): agenda outra,
+    # e enquanto isso responde com o snapshot que existe
+    if snapshot.versao != versao:
+        painel.agendar_atualizacao()
+    return cache.montar_resposta(request, snapshot.etag, snapshot.corpo, "SNAPSHOT")
+
+# 5. Análises (as consultas de queries_analiticas), sobre a visão materializada mv_despesas_operadora_periodo.
+# periodo_inicio e periodo_fim (ex: 1T2024) limitam o intervalo; sem eles, todos os trimestres carregados
+@app.get("/api/analises/crescimento", response_model=schemas.AnaliseCrescimento)
+@cache.em_cache(schemas.AnaliseCrescimento)
+async def analisar_crescimento(
+    request: Request,
+    periodo_inicio: Optional[str] = Query(None, description="Primeiro trimestre, ex: 1T2024"),
+    periodo_fim: Optional[str] = Query(None, description="Último trimestre, ex: 3T2025"),
+    limite: int = Query(5, ge=1, le=100),
+    db: AsyncSession = Depends(database.get_db)
+):
+    inicio, fim = analises.intervalo(periodo_inicio, periodo_fim)
+    return await analises.crescimento(db, inicio, fim, limite)
+
+@app.get("/api/analises/acima-media", response_model=schemas.AnaliseAcimaMedia)
+@cache.em_cache(schemas.AnaliseAcimaMedia)
+async def analisar_acima_media(
+    request: Request,
+    periodo_inicio: Optional[str] = Query(None, description="Primeiro trimestre, ex: 1T2024"),
+    periodo_fim: Optional[str] = Query(None, description="Último trimestre, ex: 3T2025"),
+    minimo_trimestres: int = Query(2, ge=1),
+    limite: int = Query(10, ge=0, le=100),
+    db: AsyncSession = Depends(database.get_db)
+):
+    inicio, fim = analises.intervalo(periodo_inicio, periodo_fim)
+    return await analises.acima_media(db, inicio, fim, minimo_trimestres, limite)
+
+@app.get("/api/analises/uf", response_model=schemas.AnaliseUF)
+@cache.em_cache(schemas.AnaliseUF)
+async def analisar_uf(
+    request: Request,
+    periodo_inicio: Optional[str] = Query(None, description="Primeiro trimestre, ex: 1T2024"),
+    periodo_fim: Optional[str] = Query(None, description="Último trimestre, ex: 3T2025"),
+    limite: int = Query(5, ge=1, le=30),
+    db: AsyncSession = Depends(database.get_db)
+):
+    inicio, fim = analises.intervalo(periodo_inicio, periodo_fim)
+    return await analises.despesas_por_uf(db, inicio, fim, limite)
+
+# Métricas no formato do Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    return metricas.exportar()
+
+# 5.1. Diagnóstico do pool de conexões deste worker: conexões em uso e ociosas, requisições aguardando
+# e tempos de checkout (ms), para dimensionar DB_POOL_TAMANHO/DB_POOL_EXTRA. Cada worker responde pelo seu pool
+@app.get("/api/diagnostico/pool")
+async def diagnosticar_pool():
+    return database.estatisticas_pool()
+
+# 6. Exportação completa das despesas com os dados da operadora, em NDJSON ou CSV (opcionalmente em gzip).
+# Enviada em streaming a partir de um cursor no servidor; não passa pelo cache de respostas
+@app.get("/api/exportacao/despesas")
+async def exportar_despesas(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv"),
+    periodo_inicio: Optional[str] = Query(None, description="Primeiro trimestre, ex: 1T2024"),
+    periodo_fim: Optional[str] = Query(None, description="Último trimestre, ex: 3T2025"),
+    uf: Optional[str] = Query(None, min_length=2, max_length=2),
+    modalidade: Optional[str] = Query(None, description="Modalidade da operadora, ex: Medicina de Grupo"),
+    compactar: bool = Query(False, description="Envia o arquivo compactado em gzip")
+):
+    # Os filtros são validados antes de começar a enviar a resposta
+    inicio, fim = analises.intervalo(periodo_inicio, periodo_fim)
+    query = exportacao.montar_consulta(inicio, fim, uf, modalidade)
+
+    nome_arquivo = "despesas." + formato
+    tipo = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    if compactar:
+        nome_arquivo += ".gz"
+        tipo = "application/gzip"
+
+    return StreamingResponse(
+        exportacao.gerar_exportacao(query, formato, compactar),
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+    )
@@ -0,0 +1,135 @@
+import contextvars
+import os
+import re
+import time
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+from . import database
+
+# Métricas da API no formato do Prometheus (rota /metrics): latência por rota e tempo/linhas das consultas SQL
+# atribuídos à rota que as executou. A diferença entre o tempo da requisição e o tempo em SQL é o gasto
+# na aplicação (montagem dos objetos do ORM, validação e serialização).
+# Cada worker do uvicorn expõe as suas próprias métricas
+
+# Consultas acima desse tempo (ms) são registradas no log com a rota e o SQL; 0 desativa
+SQL_LENTA_MS = float(os.getenv("SQL_LENTA_MS", "500"))
+
+# Rótulo das consultas feitas fora de uma requisição (ex: reconstrução do painel em segundo plano)
+SEM_ROTA = "(fora de requisição)"
+
+FAIXAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUISICAO_SEGUNDOS = Histogram(
+    "api_requisicao_segundos", "Duração das requisições, até o fim do envio da resposta",
+    ["metodo", "rota", "status"], buckets=FAIXAS_SEGUNDOS
+)
+REQUISICAO_SQL_SEGUNDOS = Histogram(
+    "api_requisicao_sql_segundos", "Tempo total em consultas SQL por requisição",
+    ["rota"], buckets=FAIXAS_SEGUNDOS
+)
+REQUISICAO_CONSULTAS = Histogram(
+    "api_requisicao_consultas", "Quantidade de consultas SQL por requisição",
+    ["rota"], buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100)
+)
+SQL_SEGUNDOS = Histogram(
+    "api_sql_segundos", "Duração de cada consulta SQL",
+    ["rota", "comando", "consulta"], buckets=FAIXAS_SEGUNDOS
+)
+SQL_LINHAS = Counter("api_sql_linhas", "Linhas retornadas ou afetadas pelas consultas SQL", ["rota", "comando", "consulta"])
+SQL_LENTAS = Counter("api_sql_lentas", "Consultas SQL acima de SQL_LENTA_MS", ["rota"])
+
+POOL_EM_USO = Gauge("api_pool_conexoes_em_uso", "Conexões do pool em uso")
+POOL_OCIOSAS = Gauge("api_pool_conexoes_ociosas", "Conexões ociosas no pool")
+POOL_AGUARDANDO = Gauge("api_pool_aguardando", "Requisições aguardando uma conexão do pool")
+
+# Tipo da consulta (rótulo 'consulta'), para separar as consultas de uma mesma rota (ex: a contagem e a página
+# da listagem). Vem da opção de execução 'consulta' (query.execution_options(consulta="pagina")); sem ela,
+# contagens (count(...)) são reconhecidas pelo SQL e as demais ficam como OUTRA_CONSULTA
+OUTRA_CONSULTA = "outra"
+PADRAO_CONTAGEM = re.compile(r"^\s*select\s+count\(", re.IGNORECASE)
+
+# Requisição atual (scope ASGI e tempo acumulado em SQL), para que os ganchos do SQLAlchemy
+# saibam a qual rota atribuir cada consulta
+_requisicao_atual = contextvars.ContextVar("requisicao_atual", default=None)
+
+
+def rotulo_rota(scope):
+    rota = scope.get("route")
+    return getattr(rota, "path", None) or "(não encontrada)"
+
+# Middleware ASGI: mede até o último pedaço da resposta, inclusive nas respostas em streaming (exportação)
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        dados = {"scope": scope, "sql_segundos": 0.0, "consultas": 0, "status": 500}
+        token = _requisicao_atual.set(dados)
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                dados["status"] = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _requisicao_atual.reset(token)
+            rota = rotulo_rota(scope)
+            if rota != "/metrics":
+                REQUISICAO_SEGUNDOS.labels(scope["method"], rota, str(dados["status"])).observe(time.perf_counter() - inicio)
+                REQUISICAO_SQL_SEGUNDOS.labels(rota).observe(dados["sql_segundos"])
+                REQUISICAO_CONSULTAS.labels(rota).observe(dados["consultas"])
+
+def tipo_da_consulta(statement, context):
+    opcoes = getattr(context, "execution_options", None) or {}
+    if opcoes.get("consulta"):
+        return opcoes["consulta"]
+    return "contagem" if PADRAO_CONTAGEM.match(statement) else OUTRA_CONSULTA
+
+# Ganchos do SQLAlchemy em volta de cada execução no banco
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - conn.info["inicio_consultas"].pop()
+    comando = statement.split(None, 1)[0].lower() if statement.strip() else "?"
+    consulta = tipo_da_consulta(statement, context)
+    linhas = cursor.rowcount if cursor.rowcount is not None else -1
+
+    dados = _requisicao_atual.get()
+    rota = SEM_ROTA
+    if dados is not None:
+        rota = rotulo_rota(dados["scope"])
+        dados["sql_segundos"] += duracao
+        dados["consultas"] += 1
+
+    SQL_SEGUNDOS.labels(rota, comando, consulta).observe(duracao)
+    if linhas > 0:
+        SQL_LINHAS.labels(rota, comando, consulta).inc(linhas)
+
+    if SQL_LENTA_MS and duracao * 1000 >= SQL_LENTA_MS:
+        SQL_LENTAS.labels(rota).inc()
+        print(f"[SQL lenta] {duracao * 1000:.1f} ms, {linhas} linha(s), rota {rota}: {' '.join(statement.split())[:500]}")
+
+def instrumentar(engine):
+    alvo = engine.sync_engine
+    if not event.contains(alvo, "before_cursor_execute", _antes_da_consulta):
+        event.listen(alvo, "before_cursor_execute", _antes_da_consulta)
+        event.listen(alvo, "after_cursor_execute", _depois_da_consulta)
+
+# Conteúdo da rota /metrics
+def exportar():
+    estatisticas = database.estatisticas_pool()
+    POOL_EM_USO.set(estatisticas["em_uso"])
+    POOL_OCIOSAS.set(estatisticas["ociosas"])
+    POOL_AGUARDANDO.set(estatisticas["aguardando"])
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
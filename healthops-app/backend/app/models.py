@@ -1,13 +1,21 @@
-from sqlalchemy import Column, String, Integer, Date, Numeric, ForeignKey
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, Date, DateTime, Numeric, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class Operadora(Base):
     __tablename__ = "operadoras"
+    # Índices de trigramas da busca (pg_trgm), sobre o texto normalizado por normalizar_texto() do script.sql
+    __table_args__ = (
+        # Ordem e chave da paginação por cursor
+        Index("idx_operadoras_razao_social", "razao_social", "registro_operadora"),
+        Index("idx_operadoras_razao_social_trgm", text("normalizar_texto(razao_social) gin_trgm_ops"), postgresql_using="gin"),
+        Index("idx_operadoras_nome_fantasia_trgm", text("normalizar_texto(nome_fantasia) gin_trgm_ops"), postgresql_using="gin"),
+        Index("idx_operadoras_cnpj_trgm", text("(cnpj::TEXT) gin_trgm_ops"), postgresql_using="gin"),
+    )
 
     registro_operadora = Column(String(6), primary_key=True, index=True)
     cnpj = Column(String(14), unique=True, index=True, nullable=False)
-    razao_social = Column(String, index=True, nullable=False)
+    razao_social = Column(String, nullable=False)
     nome_fantasia = Column(String, nullable=True)
     modalidade = Column(String, nullable=True)
     logradouro = Column(String, nullable=True)
@@ -31,11 +39,18 @@ class Operadora(Base):
 
 class DespesaConsolidada(Base):
     __tablename__ = "despesas_consolidadas"
+    # Particionada por ano (uma partição por ano, criadas por criar_particao_despesas no script.sql)
+    __table_args__ = (
+        Index("idx_despesas_operadora_periodo", "registro_operadora", "ano", "trimestre",
+              postgresql_include=["valor_despesas"]),
+        {"postgresql_partition_by": "RANGE (ano)"},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    registro_operadora = Column(String(6), ForeignKey("operadoras.registro_operadora"), nullable=False, index=True)
+    registro_operadora = Column(String(6), ForeignKey("operadoras.registro_operadora"), nullable=False)
     trimestre = Column(String(2), nullable=False)
-    ano = Column(Integer, nullable=False)
+    # Faz parte da chave primária por ser a coluna de partição
+    ano = Column(Integer, primary_key=True, nullable=False)
     valor_despesas = Column(Numeric(15, 2), nullable=False)
 
     operadora = relationship("Operadora", back_populates="despesas")
@@ -48,4 +63,27 @@ class DespesaAgregada(Base):
     uf = Column(String(2), nullable=True)
     valor_total = Column(Numeric(20, 2), nullable=True)
     media_trimestral = Column(Numeric(20, 2), nullable=True)
-    desvio_padrao = Column(Numeric(20, 2), nullable=True)
\ No newline at end of file
+    desvio_padrao = Column(Numeric(20, 2), nullable=True)
+
+
+# Linha única com a versão dos dados carregados, incrementada pelo carregador a cada carga.
+# A API usa essa versão para invalidar o cache de respostas
+class VersaoDados(Base):
+    __tablename__ = "versao_dados"
+
+    id = Column(Boolean, primary_key=True, default=True)
+    versao = Column(BigInteger, nullable=False)
+    atualizado_em = Column(DateTime(timezone=True), nullable=False)
+
+
+# Visão materializada mv_despesas_operadora_periodo (script.sql): total de cada operadora por trimestre.
+# periodo = ano * 10 + trimestre (ex: 20251 para 1T2025). Somente leitura, atualizada pelo carregador
+class DespesaOperadoraPeriodo(Base):
+    __tablename__ = "mv_despesas_operadora_periodo"
+
+    registro_operadora = Column(String(6), primary_key=True)
+    periodo = Column(Integer, primary_key=True)
+    ano = Column(Integer, nullable=False)
+    trimestre = Column(String(2), nullable=False)
+    uf = Column(String(2), nullable=True)
+    total = Column(Numeric(20, 2), nullable=False)
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from . import models, schemas, database, cache, serializacao
+
+# Snapshot do painel de estatísticas (/api/estatisticas), a página inicial do frontend.
+# É montado uma vez na inicialização da API e de novo a cada nova versão dos dados; as requisições
+# recebem o snapshot pronto, já serializado, sem acessar o banco.
+# A troca é uma única atribuição: quem está lendo continua com o snapshot anterior até ela acontecer
+_snapshot = {"atual": None}
+_atualizacao = {"tarefa": None}
+
+
+class SnapshotPainel:
+    def __init__(self, versao, resposta):
+        self.versao = versao
+        self.resposta = resposta
+        self.corpo = serializacao.para_json(resposta)
+        self.etag = '"painel-%s-%s"' % (versao, hashlib.sha1(self.corpo).hexdigest()[:16])
+
+
+# Executa as consultas do painel sobre despesas_agregadas.
+# Retorna a resposta já no formato do schemas.DashboardResponse, com só as colunas usadas
+async def montar_painel(db):
+    # 1. Valor total e média
+    query_geral = select(
+        func.sum(models.DespesaAgregada.valor_total),
+        func.avg(models.DespesaAgregada.valor_total)
+    )
+    result_geral = await db.execute(query_geral)
+    total_geral, media_geral = result_geral.one()
+
+    if total_geral is None:
+        total_geral = Decimal(0)
+    if media_geral is None:
+        media_geral = Decimal(0)
+
+    # 2. Top 5 Operadoras
+    query_top5 = select(*serializacao.colunas_do_schema(models.DespesaAgregada, schemas.DespesaAgregadaBase))\
+        .order_by(models.DespesaAgregada.valor_total.desc())\
+        .limit(5)
+    result_top5 = await db.execute(query_top5)
+    top_5 = serializacao.linhas_para_dicts(result_top5.all(), schemas.DespesaAgregadaBase.model_fields)
+
+    # 3. Distribuição por UF
+    query_uf = select(
+        models.DespesaAgregada.uf,
+        func.sum(models.DespesaAgregada.valor_total).label("total")
+    )\
+    .group_by(models.DespesaAgregada.uf)\
+    .order_by(func.sum(models.DespesaAgregada.valor_total).desc())
+
+    result_uf = await db.execute(query_uf)
+
+    # Transforma o resultado (que vem como tuplas) em uma lista de dicionários
+    lista_uf = [{"uf": row.uf if row.uf else "N/A", "total": row.total} for row in result_uf.all()]
+
+    return {
+        "total_despesas": total_geral,
+        "media_despesas": media_geral,
+        "top_5_operadoras": top_5,
+        "despesas_por_uf": lista_uf
+    }
+
+# Monta um novo snapshot com sessão própria e troca pelo atual
+async def atualizar_painel():
+    versao = await cache.obter_versao()
+    async with database.AsyncSessionLocal() as db:
+        resposta = await montar_painel(db)
+    _snapshot["atual"] = SnapshotPainel(versao, resposta)
+    print(f"Painel de estatísticas atualizado (versão dos dados {versao})")
+    return _snapshot["atual"]
+
+# Gancho de atualização: reconstrói o painel em segundo plano, sem bloquear quem está lendo.
+# Se já existe uma atualização em andamento, não inicia outra
+def agendar_atualizacao(*_):
+    tarefa = _atualizacao["tarefa"]
+    if tarefa is None or tarefa.done():
+        _atualizacao["tarefa"] = asyncio.ensure_future(_atualizar_em_segundo_plano())
+    return _atualizacao["tarefa"]
+
+async def _atualizar_em_segundo_plano():
+    try:
+        await atualizar_painel()
+    except Exception as e:
+        # Mantém o snapshot anterior; a próxima requisição ao painel vê a versão desatualizada e tenta de novo
+        print(f"Erro ao atualizar o painel de estatísticas: {e}")
+
+# Snapshot atual. Só acessa o banco se ainda não existe nenhum (ex: banco indisponível na inicialização)
+async def obter_painel():
+    if _snapshot["atual"] is None:
+        await agendar_atualizacao()
+        if _snapshot["atual"] is None:
+            raise HTTPException(status_code=503, detail="Painel de estatísticas indisponível")
+    return _snapshot["atual"]
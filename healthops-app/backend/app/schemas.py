@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import os
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from datetime import date
 from decimal import Decimal
 
@@ -28,6 +29,9 @@ class OperadoraBase(BaseModel):
     class Config:
         from_attributes = True
 
+# Quantidade máxima de identificadores por requisição nas rotas em lote
+TAMANHO_MAX_LOTE = int(os.getenv("TAMANHO_MAX_LOTE", "1000"))
+
 class DespesaResponse(BaseModel):
     trimestre: str
     ano: int
@@ -38,9 +42,16 @@ class DespesaResponse(BaseModel):
 
 class PaginatedResponse(BaseModel):
     data: List[OperadoraBase]
-    total: int
-    page: int
+    # Nulo quando a contagem não foi pedida (contagem=nenhuma)
+    total: Optional[int] = None
+    # Nulo na paginação por cursor
+    page: Optional[int] = None
     limit: int
+    # Como o total foi obtido: exata, estimada ou nenhuma
+    contagem: str = "exata"
+    # Tokens opacos para a próxima página e a anterior (paginação por cursor)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 class DespesaAgregadaBase(BaseModel):
     razao_social: str
@@ -58,4 +69,71 @@ class DashboardResponse(BaseModel):
     total_despesas: Decimal
     media_despesas: Decimal
     top_5_operadoras: List[DespesaAgregadaBase]
-    despesas_por_uf: List[DespesaPorUF]
\ No newline at end of file
+    despesas_por_uf: List[DespesaPorUF]
+
+# Análises (/api/analises), calculadas sobre a visão materializada mv_despesas_operadora_periodo.
+# Os períodos vêm no formato do nome das pastas da ANS (ex: 1T2025)
+class CrescimentoOperadora(BaseModel):
+    registro_operadora: str
+    razao_social: str
+    valor_inicial: Decimal
+    valor_final: Decimal
+    crescimento_percentual: Decimal
+
+class AnaliseCrescimento(BaseModel):
+    periodo_inicial: Optional[str] = None
+    periodo_final: Optional[str] = None
+    operadoras: List[CrescimentoOperadora]
+
+class OperadoraAcimaMedia(BaseModel):
+    registro_operadora: str
+    razao_social: str
+    trimestres_acima: int
+
+class AnaliseAcimaMedia(BaseModel):
+    periodo_inicial: Optional[str] = None
+    periodo_final: Optional[str] = None
+    minimo_trimestres: int
+    qtd_operadoras: int
+    # As 'limite' operadoras com mais trimestres acima da média
+    operadoras: List[OperadoraAcimaMedia]
+
+class DespesasUF(BaseModel):
+    uf: Optional[str] = None
+    despesas_totais: Decimal
+    qtd_operadoras: int
+    media_por_operadora: Optional[Decimal] = None
+
+class AnaliseUF(BaseModel):
+    periodo_inicial: Optional[str] = None
+    periodo_final: Optional[str] = None
+    ufs: List[DespesasUF]
+
+# Rotas em lote: identificadores em qualquer mistura de CNPJ e Registro ANS, com ou sem pontuação
+class LoteIdentificadores(BaseModel):
+    identificadores: List[str] = Field(..., min_length=1, max_length=TAMANHO_MAX_LOTE)
+
+# As respostas são indexadas pelo identificador como foi enviado; os não encontrados vêm com null
+class LoteOperadorasResponse(BaseModel):
+    resultados: Dict[str, Optional[OperadoraBase]]
+    nao_encontrados: List[str]
+
+class LoteDespesasResponse(BaseModel):
+    resultados: Dict[str, Optional[List[DespesaResponse]]]
+    nao_encontrados: List[str]
+
+# Série de despesas por trimestre (/api/despesas/serie): um total por ano/trimestre de cada operadora
+class PontoSerie(BaseModel):
+    periodo: str
+    ano: int
+    trimestre: str
+    valor_despesas: Decimal
+
+class SerieOperadora(BaseModel):
+    registro_operadora: str
+    razao_social: str
+    serie: List[PontoSerie]
+
+class SerieDespesasResponse(BaseModel):
+    operadoras: List[SerieOperadora]
+    nao_encontrados: List[str]
@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+import orjson
+
+# Caminho rápido das rotas mais acessadas: as consultas selecionam só as colunas da resposta, as linhas viram
+# dicionários na ordem dos campos do schema e o JSON é gerado direto pelo orjson, sem montar objetos do ORM
+# nem validar com o pydantic. O JSON gerado é o mesmo do pydantic (Decimal como texto, datas em ISO 8601),
+# e os schemas continuam nos response_model das rotas, então a documentação (OpenAPI) não muda
+
+
+# Colunas do modelo do ORM na ordem dos campos do schema de resposta
+def colunas_do_schema(modelo_orm, schema):
+    return [getattr(modelo_orm, nome) for nome in schema.model_fields]
+
+# Linhas (tuplas) do resultado da consulta em dicionários com os nomes das colunas
+def linhas_para_dicts(linhas, nomes):
+    return [dict(zip(nomes, linha)) for linha in linhas]
+
+# Tipos que o orjson não conhece; Decimal vai como texto, igual ao pydantic
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+def para_json(dados):
+    return orjson.dumps(dados, default=_padrao)
@@ -1,3 +1,14 @@
+-- 0. Extensões usadas na busca de operadoras
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Texto em minúsculas e sem acentos, usado nos índices e na busca.
+-- unaccent() não é IMMUTABLE (depende da configuração do dicionário) e por isso não pode ir direto em um índice;
+-- fixando o dicionário a função pode ser declarada IMMUTABLE
+CREATE FUNCTION normalizar_texto(texto TEXT) RETURNS TEXT AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, texto))
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
 -- 1. Tabela de Dimensão: Operadoras
 CREATE TABLE operadoras (
     registro_operadora CHAR(6) PRIMARY KEY, 
@@ -22,23 +33,46 @@ CREATE TABLE operadoras (
     data_registro_ans DATE
 );
 
-CREATE INDEX idx_operadoras_razao_social ON operadoras(razao_social);
+-- Também serve a paginação por cursor da API, que ordena e filtra por (razao_social, registro_operadora)
+CREATE INDEX idx_operadoras_razao_social ON operadoras(razao_social, registro_operadora);
+
+-- Índices de trigramas para a busca por trecho (LIKE '%termo%') e ordenação por similaridade.
+-- O CNPJ já é gravado só com dígitos
+CREATE INDEX idx_operadoras_razao_social_trgm ON operadoras USING GIN (normalizar_texto(razao_social) gin_trgm_ops);
+CREATE INDEX idx_operadoras_nome_fantasia_trgm ON operadoras USING GIN (normalizar_texto(nome_fantasia) gin_trgm_ops);
+CREATE INDEX idx_operadoras_cnpj_trgm ON operadoras USING GIN ((cnpj::TEXT) gin_trgm_ops);
 
 
 -- 2. Tabela Fato: Despesas Consolidadas
+-- Particionada por ano: consultas limitadas a um período leem apenas as partições necessárias
 CREATE TABLE despesas_consolidadas (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     registro_operadora CHAR(6) NOT NULL,
     trimestre CHAR(2) NOT NULL,
     ano INT NOT NULL,
     valor_despesas DECIMAL(15, 2) NOT NULL,
-    
+
+    -- Em tabela particionada a chave primária precisa conter a coluna de partição
+    PRIMARY KEY (id, ano),
+
     CONSTRAINT fk_operadora_despesa 
         FOREIGN KEY (registro_operadora) 
         REFERENCES operadoras(registro_operadora)
-);
-
-CREATE INDEX idx_despesas_reg_operadora ON despesas_consolidadas(registro_operadora);
+) PARTITION BY RANGE (ano);
+
+-- Índice de cobertura do histórico de uma operadora: a consulta é respondida só pelo índice
+-- (index-only scan), já na ordem de ano/trimestre
+CREATE INDEX idx_despesas_operadora_periodo ON despesas_consolidadas (registro_operadora, ano, trimestre) INCLUDE (valor_despesas);
+
+-- Cria a partição de um ano, caso ainda não exista. Também é usada pelo carregador (data_scripts/carregador.py)
+CREATE FUNCTION criar_particao_despesas(p_ano INT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF despesas_consolidadas FOR VALUES FROM (%s) TO (%s)',
+        'despesas_consolidadas_' || p_ano, p_ano, p_ano + 1
+    );
+END;
+$$ LANGUAGE plpgsql;
 
 -- 3. Tabela de Agregação
 CREATE TABLE despesas_agregadas (
@@ -49,6 +83,16 @@ CREATE TABLE despesas_agregadas (
     desvio_padrao DECIMAL(20, 2)
 );
 
+-- Versão dos dados carregados (linha única). O carregador incrementa a cada carga e a API
+-- usa o valor para invalidar o cache de respostas e gerar os ETags
+CREATE TABLE versao_dados (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    versao BIGINT NOT NULL,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO versao_dados (versao) VALUES (1);
+
 -- 4. Inserção dados operadoras
 CREATE TEMP TABLE staging_operadoras (
     registro_operadora TEXT,
@@ -114,6 +158,9 @@ CREATE TEMP TABLE staging_despesas (
 COPY staging_despesas FROM '/tmp/csv_data/consolidado_despesas.csv' 
 WITH (FORMAT CSV, HEADER true, DELIMITER ';', ENCODING 'UTF8');
 
+-- Uma partição para cada ano presente no arquivo
+SELECT criar_particao_despesas(ano) FROM (SELECT DISTINCT ano::INT AS ano FROM staging_despesas) AS anos;
+
 INSERT INTO despesas_consolidadas (registro_operadora, trimestre, ano, valor_despesas)
 SELECT 
     LPAD(reg_ans, 6, '0'),
@@ -148,4 +195,29 @@ SELECT
     NULLIF(REPLACE(media_trimestral, ',', '.'), '')::DECIMAL(20,2),
     NULLIF(REPLACE(desvio_padrao, ',', '.'), '')::DECIMAL(20,2)
 FROM staging_agregadas
-ON CONFLICT (razao_social) DO NOTHING;
\ No newline at end of file
+ON CONFLICT (razao_social) DO NOTHING;
+
+-- 6. Visão materializada das análises (/api/analises e queries_analiticas)
+-- Total de cada operadora em cada trimestre, com a UF do cadastro e uma chave numérica do período
+-- (ano * 10 + trimestre, ex: 20251 para 1T2025) que pode ser ordenada e filtrada por intervalo.
+-- É atualizada pelo carregador (REFRESH ... CONCURRENTLY) a cada carga, sem bloquear as leituras
+CREATE MATERIALIZED VIEW mv_despesas_operadora_periodo AS
+SELECT
+    d.registro_operadora,
+    d.ano * 10 + LEFT(d.trimestre, 1)::INT AS periodo,
+    d.ano,
+    d.trimestre,
+    o.uf,
+    SUM(d.valor_despesas) AS total
+FROM despesas_consolidadas AS d
+JOIN operadoras AS o ON o.registro_operadora = d.registro_operadora
+GROUP BY d.registro_operadora, d.ano, d.trimestre, o.uf;
+
+-- Índice único: obrigatório para o REFRESH CONCURRENTLY
+CREATE UNIQUE INDEX idx_mv_despesas_operadora_periodo ON mv_despesas_operadora_periodo (registro_operadora, periodo);
+CREATE INDEX idx_mv_despesas_periodo ON mv_despesas_operadora_periodo (periodo);
+
+-- Atualiza o mapa de visibilidade (necessário para o index-only scan) e as estatísticas
+VACUUM ANALYZE despesas_consolidadas;
+ANALYZE operadoras;
+ANALYZE mv_despesas_operadora_periodo;
@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import asyncpg
+import httpx
+
+import semear
+
+# Teste de carga da API: semeia um Postgres local (semear.py), sobe a API com uvicorn e dispara requisições
+# com concorrência e mistura de rotas configuráveis. Para cada cenário mede p50/p95/p99 e requisições por
+# segundo, registra o resultado em JSON Lines e compara com a linha de base salva para a mesma configuração,
+# terminando com código 1 quando algum cenário piora além da tolerância.
+# Uso: python teste_carga.py --semear --concorrencia 32 --duracao 30
+#      python teste_carga.py --url http://localhost:8000 --database-url postgresql://... (API já no ar)
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_RESULTADOS = os.path.join(PASTA, "resultados_carga.jsonl")
+ARQUIVO_BASE = os.path.join(PASTA, "base_carga.json")
+
+# Peso padrão de cada cenário na mistura de requisições
+MISTURA_PADRAO = "listagem=4,busca=3,pagina_profunda=1,detalhe=2,despesas=2,estatisticas=2"
+
+
+# --- CENÁRIOS ---
+# Cada cenário monta a URL da próxima requisição a partir dos dados de referência lidos do banco
+def listagem(ref, rnd):
+    return f"/api/operadoras?page={rnd.randint(1, 20)}&limit=10"
+
+def busca(ref, rnd):
+    return "/api/operadoras?search=" + rnd.choice(ref["termos"])
+
+def pagina_profunda(ref, rnd):
+    ultima = max(1, math.ceil(ref["total"] / 50))
+    return f"/api/operadoras?page={rnd.randint(max(1, ultima - 20), ultima)}&limit=50"
+
+def detalhe(ref, rnd):
+    return "/api/operadoras/" + rnd.choice(ref["registros"])
+
+def despesas(ref, rnd):
+    return f"/api/operadoras/{rnd.choice(ref['registros'])}/despesas"
+
+def estatisticas(ref, rnd):
+    return "/api/estatisticas"
+
+CENARIOS = {
+    "listagem": listagem,
+    "busca": busca,
+    "pagina_profunda": pagina_profunda,
+    "detalhe": detalhe,
+    "despesas": despesas,
+    "estatisticas": estatisticas,
+}
+
+
+def ler_mistura(texto):
+    mistura = {}
+    for item in texto.split(","):
+        nome, peso = item.split("=")
+        if nome.strip() not in CENARIOS:
+            raise SystemExit(f"Cenário desconhecido: {nome}. Disponíveis: {', '.join(CENARIOS)}")
+        if float(peso) > 0:
+            mistura[nome.strip()] = float(peso)
+    return mistura
+
+# Registros, termos de busca (palavras da razão social e trechos de CNPJ) e total de operadoras
+async def carregar_referencias(database_url, rnd):
+    conn = await asyncpg.connect(database_url)
+    try:
+        linhas = await conn.fetch("SELECT registro_operadora, razao_social, cnpj FROM operadoras ORDER BY random() LIMIT 2000")
+        total = await conn.fetchval("SELECT COUNT(*) FROM operadoras")
+    finally:
+        await conn.close()
+    if not linhas:
+        raise SystemExit("Banco sem operadoras: execute com --semear")
+
+    termos = set()
+    for linha in linhas:
+        palavras = [p for p in linha["razao_social"].split() if len(p) >= 4 and not p.isdigit()]
+        if palavras:
+            termos.add(rnd.choice(palavras).lower())
+        termos.add(linha["cnpj"][:8])
+    return {"registros": [l["registro_operadora"] for l in linhas], "termos": sorted(termos), "total": total}
+
+
+# --- API ---
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def iniciar_api(database_url, workers, sem_cache):
+    porta = porta_livre()
+    ambiente = dict(os.environ, DATABASE_URL=database_url.replace("postgresql://", "postgresql+asyncpg://", 1))
+    if sem_cache:
+        ambiente["CACHE_MAX_ITENS"] = "0"
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(porta),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=semear.PASTA_BACKEND, env=ambiente
+    )
+    return processo, f"http://127.0.0.1:{porta}"
+
+async def aguardar_api(url, processo, limite=60):
+    async with httpx.AsyncClient(base_url=url) as cliente:
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim:
+            if processo is not None and processo.poll() is not None:
+                raise SystemExit("A API terminou antes de ficar pronta")
+            try:
+                if (await cliente.get("/api/estatisticas")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"A API não respondeu em {limite}s")
+
+
+# --- CARGA ---
+async def trabalhador(cliente, ref, mistura, rnd, fim, medidas):
+    nomes, pesos = list(mistura), list(mistura.values())
+    while time.perf_counter() < fim:
+        nome = rnd.choices(nomes, pesos)[0]
+        url = CENARIOS[nome](ref, rnd)
+        inicio = time.perf_counter()
+        try:
+            resposta = await cliente.get(url)
+            ok = resposta.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        duracao = time.perf_counter() - inicio
+        if medidas is not None:
+            medida = medidas.setdefault(nome, {"tempos": [], "erros": 0})
+            if ok:
+                medida["tempos"].append(duracao)
+            else:
+                medida["erros"] += 1
+
+async def disparar(url, ref, mistura, concorrencia, segundos, seed, medidas):
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as cliente:
+        fim = time.perf_counter() + segundos
+        await asyncio.gather(*[
+            trabalhador(cliente, ref, mistura, random.Random(seed + i), fim, medidas) for i in range(concorrencia)
+        ])
+
+def percentil(tempos, p):
+    if not tempos:
+        return None
+    return round(tempos[min(len(tempos) - 1, int(len(tempos) * p))] * 1000, 2)
+
+def resumir(medidas, segundos):
+    resumo = {}
+    for nome, medida in sorted(medidas.items()):
+        tempos = sorted(medida["tempos"])
+        resumo[nome] = {
+            "requisicoes": len(tempos),
+            "erros": medida["erros"],
+            "rps": round(len(tempos) / segundos, 1),
+            "p50_ms": percentil(tempos, 0.50),
+            "p95_ms": percentil(tempos, 0.95),
+            "p99_ms": percentil(tempos, 0.99),
+            "max_ms": round(tempos[-1] * 1000, 2) if tempos else None,
+        }
+    return resumo
+
+
+# --- LINHA DE BASE ---
+def chave_configuracao(configuracao):
+    return json.dumps(configuracao, sort_keys=True)
+
+def carregar_base(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Piora de latência (p95/p99) ou de vazão além da tolerância, erros onde não havia, ou limite absoluto de p95
+def verificar_regressoes(cenarios, base, tolerancia, limite_p95_ms):
+    regressoes = []
+    for nome, medida in cenarios.items():
+        if limite_p95_ms and medida["p95_ms"] is not None and medida["p95_ms"] > limite_p95_ms:
+            regressoes.append(f"{nome}.p95_ms: {medida['p95_ms']} acima do limite {limite_p95_ms}")
+        anterior = (base or {}).get("cenarios", {}).get(nome)
+        if not anterior:
+            continue
+        for metrica in ["p95_ms", "p99_ms"]:
+            if medida[metrica] is not None and anterior[metrica] and medida[metrica] > anterior[metrica] * (1 + tolerancia):
+                regressoes.append(f"{nome}.{metrica}: {anterior[metrica]} -> {medida[metrica]}")
+        if medida["rps"] < anterior["rps"] * (1 - tolerancia):
+            regressoes.append(f"{nome}.rps: {anterior['rps']} -> {medida['rps']}")
+        if medida["erros"] and not anterior["erros"]:
+            regressoes.append(f"{nome}.erros: 0 -> {medida['erros']}")
+    return regressoes
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=PASTA).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def executar(args):
+    rnd = random.Random(args.seed)
+    database_url = args.database_url or semear.url_do_banco(args.database_url_admin, args.banco)
+    if args.semear:
+        database_url = await semear.semear(args.database_url_admin, args.banco, args.script, args.pasta,
+                                           args.operadoras, anos=args.anos)
+
+    mistura = ler_mistura(args.mistura)
+    ref = await carregar_referencias(database_url, rnd)
+
+    processo, url = (None, args.url) if args.url else iniciar_api(database_url, args.workers, args.sem_cache)
+    try:
+        await aguardar_api(url, processo)
+        if args.aquecimento:
+            print(f"Aquecendo por {args.aquecimento:g}s...")
+            await disparar(url, ref, mistura, args.concorrencia, args.aquecimento, args.seed, None)
+
+        print(f"Disparando por {args.duracao:g}s com {args.concorrencia} requisições simultâneas...")
+        medidas = {}
+        inicio = time.perf_counter()
+        await disparar(url, ref, mistura, args.concorrencia, args.duracao, args.seed, medidas)
+        segundos = time.perf_counter() - inicio
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+    configuracao = {
+        "concorrencia": args.concorrencia,
+        "mistura": mistura,
+        "workers": None if args.url else args.workers,
+        "sem_cache": args.sem_cache,
+        "operadoras": ref["total"],
+    }
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "duracao_s": round(segundos, 1),
+        "configuracao": configuracao,
+        "cenarios": resumir(medidas, segundos),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API contra um Postgres semeado")
+    parser.add_argument("--semear", action="store_true", help="Recria o banco de testes antes da carga (semear.py)")
+    parser.add_argument("--database-url-admin", default=semear.DATABASE_URL_ADMIN)
+    parser.add_argument("--banco", default=semear.BANCO_CARGA)
+    parser.add_argument("--database-url", help="Banco já semeado (padrão: --banco no servidor de --database-url-admin)")
+    parser.add_argument("--script", default=semear.SCRIPT_SQL)
+    parser.add_argument("--pasta", default="/tmp/ans_carga_csv")
+    parser.add_argument("--operadoras", type=int, default=5000)
+    parser.add_argument("--anos", type=int, default=6)
+    parser.add_argument("--url", help="API já no ar; sem ela a API é iniciada com uvicorn apontando para o banco de testes")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn quando a API é iniciada pelo teste")
+    parser.add_argument("--sem-cache", action="store_true", help="Desativa o cache de respostas da API (CACHE_MAX_ITENS=0)")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=30, help="Segundos de medição")
+    parser.add_argument("--aquecimento", type=float, default=5, help="Segundos de carga antes da medição")
+    parser.add_argument("--mistura", default=MISTURA_PADRAO, help="Pesos dos cenários, ex: " + MISTURA_PADRAO)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--resultados", default=ARQUIVO_RESULTADOS)
+    parser.add_argument("--base", default=ARQUIVO_BASE, help="Arquivo com as linhas de base por configuração")
+    parser.add_argument("--salvar-base", action="store_true", help="Salva este resultado como linha de base da configuração")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Piora relativa aceita antes de apontar regressão")
+    parser.add_argument("--limite-p95-ms", type=float, help="Falha se o p95 de algum cenário passar desse valor")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args))
+
+    print(f"{'cenário':<16} | {'requisições':>11} | {'erros':>5} | {'req/s':>8} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9}")
+    for nome, m in resultado["cenarios"].items():
+        print(f"{nome:<16} | {m['requisicoes']:>11,} | {m['erros']:>5} | {m['rps']:>8.1f} | "
+              f"{m['p50_ms'] or 0:>9.2f} | {m['p95_ms'] or 0:>9.2f} | {m['p99_ms'] or 0:>9.2f}")
+
+    bases = carregar_base(args.base)
+    chave = chave_configuracao(resultado["configuracao"])
+    regressoes = verificar_regressoes(resultado["cenarios"], bases.get(chave), args.tolerancia, args.limite_p95_ms)
+    for regressao in regressoes:
+        print(f"   [REGRESSÃO] {regressao} (linha de base: commit {bases.get(chave, {}).get('commit')})")
+
+    with open(args.resultados, "a", encoding="utf-8") as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+    if args.salvar_base:
+        bases[chave] = resultado
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(bases, f, ensure_ascii=False, indent=2)
+        print(f"Linha de base salva em {args.base}")
+
+    if regressoes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
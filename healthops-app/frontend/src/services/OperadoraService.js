@@ -17,6 +17,12 @@ export default {
     return api.get(`/operadoras/${id}/despesas`);
   },
 
+  // Função para buscar o total de despesas por trimestre de uma ou mais operadoras
+  // Recebe params como: { periodo_inicio: '1T2024', periodo_fim: '4T2025' }
+  getSerieDespesas(registros, params = {}) {
+    return api.get('/despesas/serie', { params: { ...params, registros: registros.join(',') } });
+  },
+
   // Função para buscar estatísticas
   getEstatisticas() {
     return api.get('/estatisticas');
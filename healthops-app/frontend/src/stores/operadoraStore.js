@@ -1,6 +1,8 @@
 import { defineStore } from 'pinia';
 import OperadoraService from '../services/OperadoraService';
 
+const TAMANHO_MINIMO_BUSCA = 3;
+
 export const useOperadoraStore = defineStore('operadora', {
   
   state: () => ({
@@ -35,7 +37,8 @@ export const useOperadoraStore = defineStore('operadora', {
         this.total = response.data.total;
       } catch (error) {
         console.error(error);
-        this.erro = 'Erro ao carregar dados.';
+        const detalhe = error.response?.data?.detail;
+        this.erro = typeof detalhe === 'string' ? detalhe : 'Erro ao carregar dados.';
       } finally {
         this.loading = false;
       }
@@ -49,6 +52,11 @@ export const useOperadoraStore = defineStore('operadora', {
     },
 
     filtrar(termo) {
+      // A API recusa buscas com menos de 3 caracteres
+      if (termo && termo.trim().length < TAMANHO_MINIMO_BUSCA) {
+        this.erro = `Digite pelo menos ${TAMANHO_MINIMO_BUSCA} caracteres para buscar.`;
+        return;
+      }
       this.search = termo;
       this.page = 1; // Sempre volta pra primeira página ao filtrar
       this.buscarOperadoras();
@@ -1,21 +1,25 @@
-WITH despesas_por_operadora AS (
-    -- Cálculo do total de gastos de cada operadora em cada trimestre
+-- Usa a visão materializada mv_despesas_operadora_periodo, que já traz o total
+-- de gastos de cada operadora em cada trimestre (periodo = ano * 10 + trimestre)
+WITH intervalo AS (
+    SELECT 0 AS periodo_inicio, 99999 AS periodo_fim
+),
+despesas_por_operadora AS (
+    -- Totais de cada operadora nos trimestres do intervalo
     SELECT 
-        ano, 
-        trimestre,
-        registro_operadora,
-        SUM(valor_despesas) AS total_operadora
-    FROM despesas_consolidadas
-    GROUP BY ano, trimestre, registro_operadora
+        mv.periodo,
+        mv.registro_operadora,
+        mv.total AS total_operadora
+    FROM mv_despesas_operadora_periodo AS mv
+    CROSS JOIN intervalo AS i
+    WHERE mv.periodo BETWEEN i.periodo_inicio AND i.periodo_fim
 ),
 media_mercado_trimestral AS (
     -- Calcula a média do mercado usando os totais do passo 1
     SELECT 
-        ano,
-        trimestre,
+        periodo,
         AVG(total_operadora) AS media_geral
     FROM despesas_por_operadora
-    GROUP BY ano, trimestre
+    GROUP BY periodo
 ),
 operadoras_acima_media AS (
     -- Cruza os dados e verifica quem ficou acima da média
@@ -23,11 +27,11 @@ operadoras_acima_media AS (
         dpo.registro_operadora
     FROM despesas_por_operadora AS dpo
     JOIN media_mercado_trimestral AS mmt 
-        ON dpo.ano = mmt.ano AND dpo.trimestre = mmt.trimestre
+        ON dpo.periodo = mmt.periodo
     WHERE dpo.total_operadora > mmt.media_geral
     GROUP BY dpo.registro_operadora
     -- Filtra apenas quem bateu a meta em 2 ou mais trimestres
     HAVING COUNT(*) >= 2
 )
 -- Contagem simples de quantas operadoras atenderam aos critérios
-SELECT COUNT(*) AS qtd_operadoras_acima FROM operadoras_acima_media;
\ No newline at end of file
+SELECT COUNT(*) AS qtd_operadoras_acima FROM operadoras_acima_media;
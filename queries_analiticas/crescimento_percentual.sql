@@ -1,20 +1,27 @@
+-- Usa a visão materializada mv_despesas_operadora_periodo (total de cada operadora por trimestre).
+-- periodo = ano * 10 + trimestre (ex: 20251 para 1T2025); para analisar outro intervalo, altere os limites abaixo
+WITH intervalo AS (
+	SELECT 0 AS periodo_inicio, 99999 AS periodo_fim
+),
 -- Obtendo qual é o primeiro trimestre e o último trimestre analisado
-WITH limites_temporais AS (
-	SELECT 
-		MIN(ano || trimestre) as periodo_inicial,
-		MAX(ano || trimestre) as periodo_final
-	FROM despesas_consolidadas
+limites AS (
+	SELECT MIN(mv.periodo) AS periodo_inicial, MAX(mv.periodo) AS periodo_final
+	FROM mv_despesas_operadora_periodo AS mv
+	CROSS JOIN intervalo AS i
+	WHERE mv.periodo BETWEEN i.periodo_inicio AND i.periodo_fim
 ),
 somas_trimestres_analisados AS (
-    -- Soma as despesas dos trimestres analisados
+    -- Totais das operadoras nos dois trimestres, já somados na visão
 	SELECT
-	d.registro_operadora,
-	COALESCE(SUM(d.valor_despesas) FILTER(WHERE (d.ano || d.trimestre) = (SELECT periodo_inicial FROM limites_temporais)), 0)AS valor_inicial,
-	COALESCE(SUM(d.valor_despesas) FILTER(WHERE (d.ano || d.trimestre) = (SELECT periodo_final FROM limites_temporais)), 0) AS valor_final
-	FROM despesas_consolidadas AS d
-	GROUP BY d.registro_operadora
+	mv.registro_operadora,
+	COALESCE(SUM(mv.total) FILTER(WHERE mv.periodo = l.periodo_inicial), 0) AS valor_inicial,
+	COALESCE(SUM(mv.total) FILTER(WHERE mv.periodo = l.periodo_final), 0) AS valor_final
+	FROM mv_despesas_operadora_periodo AS mv
+	CROSS JOIN limites AS l
+	WHERE mv.periodo IN (l.periodo_inicial, l.periodo_final)
+	GROUP BY mv.registro_operadora
 )
-SELECT 
+SELECT
     -- Faz o cálculo do crescimento percentual
 	o.razao_social,
 	soma.valor_inicial,
@@ -23,6 +30,6 @@ SELECT
 FROM somas_trimestres_analisados AS soma
 JOIN operadoras AS o ON soma.registro_operadora = o.registro_operadora
 WHERE soma.valor_inicial > 0 AND soma.valor_final > 0
-ORDER BY 
+ORDER BY
 	crescimento_percentual DESC
-LIMIT 5;
\ No newline at end of file
+LIMIT 5;
@@ -1,10 +1,11 @@
+-- Usa a visão materializada mv_despesas_operadora_periodo, que já traz a UF do cadastro.
+-- Para limitar o intervalo, filtre por periodo (ano * 10 + trimestre, ex: WHERE periodo BETWEEN 20241 AND 20244)
 SELECT 
-    o.uf,
-    SUM(d.valor_despesas) AS despesas_totais,
-    COUNT(DISTINCT o.registro_operadora) AS qtd_operadoras,
-    ROUND(SUM(d.valor_despesas) / NULLIF(COUNT(DISTINCT o.registro_operadora), 0), 2) AS media_por_operadora
-FROM despesas_consolidadas AS d
-JOIN operadoras AS o ON d.registro_operadora = o.registro_operadora
-GROUP BY o.uf
+    uf,
+    SUM(total) AS despesas_totais,
+    COUNT(DISTINCT registro_operadora) AS qtd_operadoras,
+    ROUND(SUM(total) / NULLIF(COUNT(DISTINCT registro_operadora), 0), 2) AS media_por_operadora
+FROM mv_despesas_operadora_periodo
+GROUP BY uf
 ORDER BY despesas_totais DESC
-LIMIT 5;
\ No newline at end of file
+LIMIT 5;